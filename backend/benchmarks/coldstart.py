@@ -0,0 +1,97 @@
+"""
+Cold-start benchmark: app import time and first-request latency with and without warm-up.
+
+    cd backend && uv run python -m benchmarks.coldstart [--idle 2.0] [--importtime]
+
+Each mode runs in a fresh interpreter with the offline fakes installed (including a
+simulated ee.Initialize delay). The server sits idle for --idle seconds after startup,
+as it would between a deploy and the first user, then serves one seasonal analysis.
+--importtime also prints the slowest modules from `python -X importtime`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import asyncio, json, os, sys, time
+from benchmarks.fakes import FakeConfig, install
+inject, patch_weather = install(FakeConfig())
+start = time.perf_counter()
+from src import main
+import_seconds = time.perf_counter() - start
+patch_weather()
+
+async def run():
+    import httpx
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await asyncio.sleep(float(os.environ["IDLE_SECONDS"]))
+            store = {"id": "cold-1", "name": "Cold Store", "address": "1 Cold Rd", "lat": 33.75, "lng": -84.39}
+            t = time.perf_counter()
+            resp = await client.post("/api/analyze/seasonal", json=store)
+            first = time.perf_counter() - t
+            report = (await client.get("/api/startup")).json()
+            return resp.status_code, first, report
+
+status, first, report = asyncio.run(run())
+print(json.dumps({"import_seconds": import_seconds, "first_request_seconds": first, "status": status,
+                  "numpy_loaded": "numpy" in sys.modules, "report": report}))
+"""
+
+def run_child(warmup: bool, idle: float):
+    workdir = tempfile.mkdtemp(prefix="greengrow-cold-")
+    env = {**os.environ,
+           "WARMUP": "1" if warmup else "0",
+           "IDLE_SECONDS": str(idle),
+           "GREENGROW_DB_PATH": os.path.join(workdir, "cold.db"),
+           "RASTER_CHIP_DIR": os.path.join(workdir, "chips"),
+           "PRECOMPUTE_INTERVAL_SECONDS": "0",
+           "DATA_COMMONS_API_KEY": os.environ.get("DATA_COMMONS_API_KEY", "fake")}
+    out = subprocess.run([sys.executable, "-c", _CHILD], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def import_profile(top: int = 15):
+    """
+    Slowest modules (cumulative microseconds) when importing src.main with the fakes installed.
+    """
+    code = "from benchmarks.fakes import install; install(); import src.main"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle", type=float, default=2.0, help="seconds between startup and the first request")
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    for warmup in (False, True):
+        r = run_child(warmup, args.idle)
+        warm = r["report"].get("warmup") or {}
+        print(f"WARMUP={int(warmup)}  import {r['import_seconds'] * 1000:7.1f} ms   "
+              f"first request {r['first_request_seconds'] * 1000:7.1f} ms (HTTP {r['status']})")
+        for name, step in warm.items():
+            print(f"          warm-up {name:<13} {step['seconds'] * 1000:7.1f} ms  {step['status']}")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for us, name in import_profile():
+            print(f"  {us / 1000:8.1f} ms  {name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
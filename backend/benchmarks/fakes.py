@@ -0,0 +1,417 @@
+"""
+In-process stand-ins for the upstream services, with injectable latency and failures.
+
+install() must run before anything under src/ is imported: it registers fake `ee`,
+`datacommons_client` and `google.genai` modules in sys.modules and returns a hook that
+patches the Open-Meteo session once src.services.weather is loaded.
+"""
+import datetime
+import json
+import math
+import random
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass, field
+
+@dataclass
+class Upstream:
+    latency: float = 0.0  # seconds
+    jitter: float = 0.0  # +/- fraction of latency
+    failure_rate: float = 0.0
+
+@dataclass
+class FakeConfig:
+    ee_initialize: Upstream = field(default_factory=lambda: Upstream(1.5, 0.2))
+    ee_getinfo: Upstream = field(default_factory=lambda: Upstream(0.25, 0.3))
+    ee_getmapid: Upstream = field(default_factory=lambda: Upstream(0.1, 0.3))
+    ee_tile: Upstream = field(default_factory=lambda: Upstream(0.08, 0.3))
+    ee_computepixels: Upstream = field(default_factory=lambda: Upstream(0.05, 0.3))
+    datacommons: Upstream = field(default_factory=lambda: Upstream(0.06, 0.3))
+    open_meteo: Upstream = field(default_factory=lambda: Upstream(0.04, 0.3))
+    gemini: Upstream = field(default_factory=lambda: Upstream(0.2, 0.3))
+    seed: int = 0
+
+    def scaled(self, latency_scale: float = 1.0, failure_rate: float = None):
+        for name in ("ee_initialize", "ee_getinfo", "ee_getmapid", "ee_tile", "ee_computepixels", "datacommons", "open_meteo", "gemini"):
+            up = getattr(self, name)
+            up.latency *= latency_scale
+            if failure_rate is not None:
+                up.failure_rate = failure_rate
+        return self
+
+class UpstreamError(Exception):
+    pass
+
+class _Injector:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def __call__(self, name: str):
+        up = getattr(self.config, name)
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            jitter = self.rng.uniform(-up.jitter, up.jitter)
+            fail = self.rng.random() < up.failure_rate
+        if up.latency:
+            time.sleep(max(0.0, up.latency * (1 + jitter)))
+        if fail:
+            raise UpstreamError(f"fake {name} failure")
+
+def _seeded(*parts):
+    return random.Random(hash(tuple(round(p, 4) if isinstance(p, float) else p for p in parts)))
+
+# --- Earth Engine ---
+
+class _Node:
+    """
+    A lazily built server-side object. Every method call returns a new node; values are
+    synthesized when the tree is evaluated through ee.Dictionary(...).getInfo().
+    """
+    def __init__(self, op, args=(), kwargs=None, parent=None):
+        self.op, self.args, self.kwargs, self.parent = op, args, kwargs or {}, parent
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *a, **k: _Node(name, a, k, self)
+
+    def chain(self):
+        node, out = self, []
+        while node is not None:
+            out.append(node)
+            node = node.parent
+        return out
+
+    def find(self, op):
+        for node in self.chain():
+            if node.op == op:
+                return node
+        return None
+
+    def point(self):
+        """
+        (lat, lng) of the Geometry.Point this node was derived from, if any.
+        """
+        for node in self.chain():
+            if node.op == "Geometry.Point":
+                lng, lat = node.args[0]
+                return lat, lng
+            for arg in list(node.args) + list(node.kwargs.values()):
+                if isinstance(arg, _Node) and arg is not node:
+                    p = arg.point()
+                    if p:
+                        return p
+        return None
+
+class _Factory:
+    def __init__(self, name):
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return _Node(self._name, args, kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return lambda *a, **k: _Node(f"{self._name}.{attr}", a, k)
+
+def _store_ids(collection: _Node):
+    features = collection.args[0] if collection.args else []
+    return [f.args[1].get("store_id") for f in features]
+
+def _ring_ids(collection: _Node):
+    features = collection.args[0] if collection.args else []
+    return [f.args[1]["ring"] for f in features if "ring" in f.args[1]]
+
+def _ring_props(rng, ring: int):
+    # Annulus i spans roughly (2i+1) times the pixels of the innermost disc
+    return {"ring": ring, "mean": 0.1 + 0.5 * rng.random(), "count": 40 * (2 * ring + 1),
+            "class": rng.uniform(0, 3e6) * (2 * ring + 1)}
+
+def _synth_reduce_region(node: _Node):
+    lat, lng = node.point() or (0.0, 0.0)
+    rng = _seeded("region", lat, lng)
+    frac = rng.random()
+    hotspot_m2 = rng.uniform(0, 15e6)
+    buffer_m2 = math.pi * 8046 ** 2
+    return {
+        "NDVI": 0.1 + 0.5 * frac,
+        "class": hotspot_m2,
+        "class_mean": hotspot_m2 / buffer_m2,
+        "class_count": int(buffer_m2 / 100 ** 2),
+    }
+
+def _synth_sample(node: _Node):
+    lat, lng = node.point() or (0.0, 0.0)
+    rng = _seeded("sample", lat, lng)
+    return {"features": [
+        {"geometry": {"type": "Point", "coordinates": [lng + rng.uniform(-0.05, 0.05), lat + rng.uniform(-0.05, 0.05)]},
+         "properties": {"class": 1}}
+        for _ in range(15)
+    ]}
+
+def _synth_history(node: _Node):
+    mapped = node.args[0]
+    window = mapped.find("filterDate")
+    lat, lng = node.point() or (0.0, 0.0)
+    start, end = [datetime.date.fromisoformat(str(a)[:10]) for a in window.args]
+    rng = _seeded("history", lat, lng)
+    features, day = [], start
+    while day < end:
+        features.append({"properties": {
+            "scene": f"S2_{day.isoformat()}_{lat:.2f}_{lng:.2f}",
+            "date": day.isoformat(),
+            "ndvi": 0.2 + 0.3 * rng.random(),
+        }})
+        day += datetime.timedelta(days=5)
+    return {"features": features}
+
+def _synth_ring_history(node: _Node):
+    # The mapped per-scene function reduces over the rings; call it on a stand-in image to find them
+    mapped = node.find("flatten").parent
+    rings = _ring_ids(mapped.args[0](_Node("Image")).find("reduceRegions").kwargs["collection"])
+    window = mapped.find("filterDate")
+    lat, lng = node.point() or (0.0, 0.0)
+    start, end = [datetime.date.fromisoformat(str(a)[:10]) for a in window.args]
+    rng = _seeded("history", lat, lng)
+    features, day = [], start
+    while day < end:
+        for ring in rings:
+            features.append({"properties": {**_ring_props(rng, ring), "scene": f"S2_{day.isoformat()}_{lat:.2f}_{lng:.2f}",
+                                            "date": day.isoformat()}})
+        day += datetime.timedelta(days=5)
+    return {"features": features}
+
+def _synth_scene_list(node: _Node):
+    # One scene a month over the filterDate window; aggregate_array(prop) returns one property of each
+    window = node.find("filterDate")
+    lat, lng = node.point() or (0.0, 0.0)
+    start, end = [datetime.date.fromisoformat(str(a)[:10]) for a in window.args]
+    days = range(0, (end - start).days, 30)
+    prop = node.args[0]
+    if prop == "system:index":
+        return [f"S2_{(start + datetime.timedelta(days=d)).isoformat()}_{lat:.2f}_{lng:.2f}" for d in days]
+    if prop == "system:time_start":
+        epoch = datetime.date(1970, 1, 1)
+        return [((start - epoch).days + d) * 86400 * 1000 for d in days]
+    rng = _seeded("clouds", lat, lng)
+    return [round(rng.uniform(0, 25), 1) for _ in days]
+
+def _synth_pixels(request: dict):
+    import numpy as np
+
+    dims = request["grid"]["dimensions"]
+    shape = (dims["height"], dims["width"])
+    rng = np.random.default_rng(0)
+    return {
+        "B4": np.full(shape, 1000, dtype=np.uint16),
+        "B8": np.full(shape, 2500, dtype=np.uint16),
+        "built": rng.random(shape, dtype=np.float32),
+        "label": rng.integers(0, 9, shape, dtype=np.uint8),
+    }
+
+def _synth_regions(node: _Node):
+    reduced = node.find("reduceRegions")
+    rings = _ring_ids(reduced.kwargs["collection"])
+    if rings:
+        lat, lng = node.point() or (0.0, 0.0)
+        rng = _seeded("rings", lat, lng)
+        return {"features": [{"properties": _ring_props(rng, ring)} for ring in rings]}
+    rng = random.Random(0)
+    return {"features": [
+        {"properties": {"store_id": sid, "NDVI": 0.1 + 0.5 * rng.random(), "class": rng.uniform(0, 15e6)}}
+        for sid in _store_ids(reduced.kwargs["collection"])
+    ]}
+
+def _evaluate(value):
+    if isinstance(value, dict):
+        return {k: _evaluate(v) for k, v in value.items()}
+    if not isinstance(value, _Node):
+        return value
+    if value.op == "reduceRegion":
+        return _synth_reduce_region(value)
+    if value.op == "stratifiedSample":
+        return _synth_sample(value)
+    if value.op == "aggregate_array":
+        return _synth_scene_list(value)
+    if value.op == "reduceColumns":
+        region = _synth_reduce_region(value)
+        return {"mean": region["class_mean"], "count": region["class_count"]}
+    if value.find("flatten"):
+        return _synth_ring_history(value)
+    if value.find("reduceRegions"):
+        return _synth_regions(value)
+    if value.op == "FeatureCollection" and value.args and isinstance(value.args[0], _Node) and value.args[0].op == "map":
+        return _synth_history(value)
+    return {}
+
+def make_ee(inject: _Injector):
+    ee = types.ModuleType("ee")
+    ee.EEException = UpstreamError
+    ee.Initialize = lambda *a, **k: inject("ee_initialize")
+    for name in ("Geometry", "Date", "ImageCollection", "Filter", "Reducer", "Feature", "FeatureCollection", "Image"):
+        setattr(ee, name, _Factory(name))
+
+    class Dictionary:
+        def __init__(self, values):
+            self.values = values
+
+        def getInfo(self):
+            inject("ee_getinfo")
+            return _evaluate(self.values)
+
+    def get_map_id(self, vis_params=None):
+        inject("ee_getmapid")
+        mapid = f"fake-{random.getrandbits(40):010x}"
+        return {"mapid": mapid, "tile_fetcher": types.SimpleNamespace(
+            url_format=f"https://earthengine.googleapis.com/v1/projects/fake/maps/{mapid}/tiles/{{z}}/{{x}}/{{y}}")}
+
+    _Node.getMapId = get_map_id
+    ee.Dictionary = Dictionary
+    def compute_pixels(request):
+        inject("ee_computepixels")
+        return _synth_pixels(request)
+
+    ee.data = types.SimpleNamespace(computePixels=compute_pixels)
+    return ee
+
+# --- Data Commons ---
+
+def make_datacommons(inject: _Injector):
+    dc = types.ModuleType("datacommons_client")
+
+    class _Resolve:
+        def fetch_dcid_by_coordinates(self, latitude, longitude):
+            inject("datacommons")
+            city = f"geoId/{abs(int(latitude * 10)):03d}{abs(int(longitude * 10)):04d}"
+            return {"entities": [{"candidates": [
+                {"dcid": "geoId/13", "dominantType": "State"},
+                {"dcid": city, "dominantType": "City"},
+            ]}]}
+
+    class _Observation:
+        def fetch(self, entity_dcids, variable_dcids):
+            inject("datacommons")
+            by_variable = {}
+            for var in variable_dcids:
+                by_entity = {}
+                for dcid in entity_dcids:
+                    rng = _seeded("dc", dcid, var)
+                    by_entity[dcid] = {"orderedFacets": [{"observations": [{"date": "2023", "value": round(rng.uniform(1, 100000), 1)}]}]}
+                by_variable[var] = {"byEntity": by_entity}
+            return {"byVariable": by_variable}
+
+    class DataCommonsClient:
+        def __init__(self, api_key=None, **kwargs):
+            self.resolve = _Resolve()
+            self.observation = _Observation()
+
+    dc.DataCommonsClient = DataCommonsClient
+    return dc
+
+# --- Open-Meteo ---
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeOpenMeteoSession:
+    def __init__(self, inject: _Injector):
+        self.inject = inject
+
+    def get(self, url, timeout=None, **kwargs):
+        self.inject("open_meteo")
+        rng = random.Random(url)
+        return _FakeResponse({
+            "current": {"temperature_2m": round(rng.uniform(30, 95), 1), "weather_code": rng.choice([0, 2, 61, 80])},
+            "daily": {
+                "temperature_2m_max": [round(rng.uniform(40, 100), 1) for _ in range(7)],
+                "precipitation_probability_max": [rng.randint(0, 100) for _ in range(7)],
+            },
+        })
+
+    def head(self, url, timeout=None, **kwargs):
+        return _FakeResponse({})
+
+    def mount(self, *args, **kwargs):
+        pass
+
+class FakeTileSession:
+    """
+    Serves a tiny PNG for any tile URL under a known fake map ID.
+    """
+    PNG = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                        "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+    def __init__(self, inject: _Injector):
+        self.inject = inject
+
+    def get(self, url, timeout=None, **kwargs):
+        self.inject("ee_tile")
+        resp = _FakeResponse(None)
+        resp.content = self.PNG
+        return resp
+
+    def mount(self, *args, **kwargs):
+        pass
+
+# --- Gemini ---
+
+def make_genai(inject: _Injector):
+    google = sys.modules.get("google") or types.ModuleType("google")
+    genai = types.ModuleType("google.genai")
+    genai_types = types.ModuleType("google.genai.types")
+    genai_types.GenerateContentConfig = lambda **kwargs: types.SimpleNamespace(**kwargs)
+    genai_types.HttpOptions = lambda **kwargs: types.SimpleNamespace(**kwargs)
+
+    class _Models:
+        def generate_content(self, model, contents, config=None):
+            inject("gemini")
+            if getattr(config, "response_mime_type", None) == "application/json":
+                ids = [int(line.split()[1].rstrip(":")) for line in contents.splitlines() if line.startswith("Item ")]
+                return types.SimpleNamespace(text=json.dumps(
+                    [{"id": i, "stocking_action": f"Stock seasonal item set {i}"} for i in ids]))
+            return types.SimpleNamespace(text="Push lawn fertilizer and grass seed endcaps")
+
+    class Client:
+        def __init__(self, **kwargs):
+            self.models = _Models()
+
+    genai.Client = Client
+    genai.types = genai_types
+    google.genai = genai
+    return google, genai, genai_types
+
+def install(config: FakeConfig = None):
+    """
+    Registers the fakes and returns (injector, patch_weather). Call patch_weather() after
+    importing src so the Open-Meteo and tile sessions are replaced.
+    """
+    config = config or FakeConfig()
+    inject = _Injector(config)
+    sys.modules["ee"] = make_ee(inject)
+    sys.modules["datacommons_client"] = make_datacommons(inject)
+    google, genai, genai_types = make_genai(inject)
+    sys.modules["google"] = google
+    sys.modules["google.genai"] = genai
+    sys.modules["google.genai.types"] = genai_types
+
+    def patch_weather():
+        from src.services import weather
+        from src.services import tiles
+        weather._session = FakeOpenMeteoSession(inject)
+        tiles._session = FakeTileSession(inject)
+
+    return inject, patch_weather
@@ -0,0 +1,75 @@
+"""
+Compares full (10 m) and adaptive (sample-then-refine) growth evaluation against live Earth Engine.
+
+    cd backend && uv run python -m benchmarks.growth_resolution [stores.json]
+
+stores.json holds {"stores": [{"id", "name", "lat", "lng"}, ...]}; defaults to data/mock_signals.json.
+Reports per-store hectares, the estimate used (sampled or full) and runtime for each mode, plus overall classification
+agreement, how often the full-resolution area falls inside the sampled estimate's error
+bound, and speedup. The result store is bypassed so every run hits EE.
+"""
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import ee
+
+from src.services.earth_engine import (
+    BUFFER_METERS, init_ee, _new_construction, _hotspot_ha_coarse, growth_hectares, growth_signal,
+)
+
+DEFAULT_STORES = os.path.join(os.path.dirname(__file__), "..", "..", "data", "mock_signals.json")
+
+def run_mode(lat: float, lng: float, mode: str):
+    buffer = ee.Geometry.Point([lng, lat]).buffer(BUFFER_METERS)
+    new_construction = _new_construction(buffer).clip(buffer)
+    start = time.perf_counter()
+    ha, estimate, bound = growth_hectares(new_construction, buffer, mode)
+    elapsed = time.perf_counter() - start
+    return {"ha": ha, "estimate": estimate, "bound": bound, "seconds": elapsed,
+            "intensity": growth_signal(ha, None)["intensity"]}
+
+def sampled_estimate(lat: float, lng: float):
+    buffer = ee.Geometry.Point([lng, lat]).buffer(BUFFER_METERS)
+    return _hotspot_ha_coarse(_new_construction(buffer).clip(buffer), buffer)
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_STORES
+    with open(path) as f:
+        stores = json.load(f)["stores"]
+
+    init_ee()
+    agree = 0
+    totals = {"full": 0.0, "adaptive": 0.0}
+    refined = 0
+    covered = 0
+    print(f"{'store':<32} {'full ha':>9} {'full s':>7} {'adapt ha':>9} {'±ha':>7} {'est':>7} {'adapt s':>7} match")
+    for store in stores:
+        full = run_mode(store["lat"], store["lng"], "full")
+        adaptive = run_mode(store["lat"], store["lng"], "adaptive")
+        match = full["intensity"] == adaptive["intensity"]
+        agree += match
+        refined += adaptive["estimate"] == "full"
+        estimate, bound = sampled_estimate(store["lat"], store["lng"])
+        covered += abs(estimate - full["ha"]) <= bound
+        totals["full"] += full["seconds"]
+        totals["adaptive"] += adaptive["seconds"]
+        print(f"{store['name'][:32]:<32} {full['ha']:>9.1f} {full['seconds']:>7.2f} "
+              f"{adaptive['ha']:>9.1f} {adaptive['bound']:>7.1f} {adaptive['estimate']:>7} "
+              f"{adaptive['seconds']:>7.2f} {'yes' if match else 'NO'}")
+
+    n = len(stores)
+    print()
+    print(f"classification agreement: {agree}/{n} ({agree / n:.0%})")
+    print(f"refined at full resolution: {refined}/{n}")
+    print(f"full-resolution area within the sampled error bound: {covered}/{n} ({covered / n:.0%})")
+    print(f"total runtime: full {totals['full']:.1f}s, adaptive {totals['adaptive']:.1f}s "
+          f"(speedup {totals['full'] / max(totals['adaptive'], 1e-9):.1f}x)")
+
+if __name__ == "__main__":
+    main()
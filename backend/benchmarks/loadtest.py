@@ -0,0 +1,258 @@
+"""
+Offline load test for every API route, with fakes for EE, Data Commons, Open-Meteo and Gemini.
+
+    cd backend && uv run python -m benchmarks.loadtest [options]
+
+Runs each scenario for --requests requests at --concurrency, then prints throughput and
+p50/p95/p99 latency per route. With --compare (default) results are checked against
+benchmarks/baselines.json and the exit code is 1 on a regression; --update-baseline
+rewrites the baseline from this run. Baselines come from whatever machine last wrote them,
+so the comparison is relative to the calibration route measured in the same run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from .fakes import FakeConfig, install
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+# A route that does no work, run first in every session (even with --only). Its p50 against
+# the baseline's gives the speed of this machine and run, and baseline numbers are scaled by it
+CALIBRATION_ROUTE = "GET /api"
+# p95 and mean latency changes smaller than this many calibration p95s are scheduling noise
+NOISE_FLOOR_CALIBRATION_P95 = 2.0
+
+def _store(i: int):
+    # Stores on a loose grid around Atlanta so some share cache cells and some don't
+    return {"id": f"bench-{i}", "name": f"Bench Store {i}", "address": f"{i} Bench Rd",
+            "lat": round(33.70 + (i % 10) * 0.037, 4), "lng": round(-84.50 + (i // 10) * 0.041, 4)}
+
+def scenarios(num_stores: int):
+    def store(rng):
+        return _store(rng.randrange(num_stores))
+
+    def stocking(rng):
+        s = store(rng)
+        return {"store_name": s["name"], "signal_type": "Seasonal",
+                "metric": f"High Vegetation Active (NDVI {rng.uniform(0.4, 0.6):.2f})",
+                "market_signal": "Grass is heavily active",
+                "location_context": {"current_temperature": f"{rng.uniform(60, 80):.1f}°F"}}
+
+    def job_id(rng, status=None):
+        # Jobs left behind by the extraction, refresh and sync scenarios that ran earlier
+        from src.services import jobs
+
+        return rng.choice([j["id"] for j in jobs.list_jobs(status)] or ["none"])
+
+    return {
+        "GET /api": ("GET", lambda rng: "/api", None),
+        "GET /api/startup": ("GET", lambda rng: "/api/startup", None),
+        "POST /api/context": ("POST", lambda rng: "/api/context", store),
+        "POST /api/analyze/seasonal": ("POST", lambda rng: "/api/analyze/seasonal", store),
+        "POST /api/analyze/growth": ("POST", lambda rng: "/api/analyze/growth", store),
+        "POST /api/analyze/history": ("POST", lambda rng: "/api/analyze/history", store),
+        "POST /api/analyze/stream": ("POST", lambda rng: "/api/analyze/stream", store),
+        "POST /api/analyze/rings": ("POST", lambda rng: "/api/analyze/rings?radii=1,3,5", store),
+        "POST /api/analyze/batch": ("POST", lambda rng: "/api/analyze/batch",
+                                    lambda rng: [store(rng) for _ in range(25)]),
+        "POST /api/generate_stocking_action": ("POST", lambda rng: "/api/generate_stocking_action", stocking),
+        "POST /api/generate_stocking_action/batch": ("POST", lambda rng: "/api/generate_stocking_action/batch",
+                                                     lambda rng: [stocking(rng) for _ in range(20)]),
+        "POST /api/trigger_extraction": ("POST", lambda rng: "/api/trigger_extraction", store),
+        "POST /api/raster/sync": ("POST", lambda rng: "/api/raster/sync", store),
+        "POST /api/portfolio": ("POST", lambda rng: "/api/portfolio", lambda rng: [store(rng) for _ in range(10)]),
+        "POST /api/context/prefetch": ("POST", lambda rng: "/api/context/prefetch", lambda rng: [store(rng) for _ in range(10)]),
+        "POST /api/portfolio/refresh": ("POST", lambda rng: "/api/portfolio/refresh", None),
+        "GET /api/tiles/{layer}/{z}/{x}/{y}": ("GET", lambda rng: "/api/tiles/seasonal_{lat}_{lng}/12/{x}/{y}".format(
+            **{k: v for k, v in store(rng).items() if k in ("lat", "lng")}, x=rng.randrange(1086, 1090), y=rng.randrange(1637, 1641)), None),
+        "GET /api/jobs": ("GET", lambda rng: "/api/jobs", None),
+        "GET /api/jobs/{job_id}": ("GET", lambda rng: f"/api/jobs/{job_id(rng)}", None),
+        "GET /api/jobs/{job_id}/result": ("GET", lambda rng: f"/api/jobs/{job_id(rng, 'done')}/result", None),
+        "GET /api/results/{store_id}": ("GET", lambda rng: f"/api/results/{store(rng)['id']}", None),
+        "GET /api/cache/stats": ("GET", lambda rng: "/api/cache/stats", None),
+        "GET /api/ee/stats": ("GET", lambda rng: "/api/ee/stats", None),
+        "GET /api/ee/scheduler": ("GET", lambda rng: "/api/ee/scheduler", None),
+        "GET /api/metrics": ("GET", lambda rng: "/api/metrics", None),
+    }
+
+def percentile(values, pct: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+async def run_scenario(client, method, path_fn, body_fn, requests: int, concurrency: int, seed: int):
+    rng = random.Random(seed)
+    work = [(path_fn(rng), body_fn(rng) if body_fn else None) for _ in range(requests)]
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for item in work:
+        queue.put_nowait(item)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            path, body = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, path, json=body)
+                if resp.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+def _drain_jobs(timeout: float = 60.0):
+    # Jobs enqueued by one scenario (portfolio refresh, extraction) would otherwise run in the
+    # background during the next ones and show up as their latency
+    from src.services import jobs
+
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        now = time.time()
+        pending = [j for status in ("queued", "running") for j in jobs.list_jobs(status)
+                   if not j["not_before"] or j["not_before"] <= now]
+        if not pending:
+            return
+        time.sleep(0.05)
+
+def uncovered_routes(app, names):
+    """
+    API routes of the app with no scenario, as "METHOD /path".
+    """
+    routes = {f"{method} {route.path}" for route in app.routes if route.path.startswith("/api")
+              for method in getattr(route, "methods", ()) if method not in ("HEAD", "OPTIONS")}
+    return sorted(routes - set(names))
+
+async def run(args):
+    import httpx
+    from src import main
+
+    client_transport = httpx.ASGITransport(app=main.app)
+    missing = uncovered_routes(main.app, scenarios(args.stores))
+    if missing:
+        print(f"routes without a scenario: {', '.join(missing)}")
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        # Measure steady state: finish client warm-up before the first scenario
+        await asyncio.to_thread(main.warm_up)
+        async with httpx.AsyncClient(transport=client_transport, base_url="http://bench") as client:
+            for i, (name, (method, path_fn, body_fn)) in enumerate(scenarios(args.stores).items()):
+                if args.only and name != CALIBRATION_ROUTE and not any(o in name for o in args.only):
+                    continue
+                results[name] = await run_scenario(client, method, path_fn, body_fn,
+                                                   args.requests, args.concurrency, args.seed + i)
+                await asyncio.to_thread(_drain_jobs)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    A route regresses if p95 grows or throughput drops by more than `tolerance` relative to the
+    baseline scaled to this run's calibration speed, or errors increase.
+    """
+    calibration, calibration_base = results.get(CALIBRATION_ROUTE), baseline.get(CALIBRATION_ROUTE)
+    if calibration and calibration_base and calibration_base["p50_ms"] > 0:
+        # Only ever loosens: most route latency is upstream waiting, which a faster machine doesn't shorten
+        speed = max(1.0, calibration["p50_ms"] / calibration_base["p50_ms"])
+        noise_ms = max(5.0, NOISE_FLOOR_CALIBRATION_P95 * max(calibration["p95_ms"], calibration_base["p95_ms"]))
+    else:
+        speed, noise_ms = 1.0, 5.0
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if r["errors"] > b.get("errors", 0):
+            regressions.append(f"{name}: errors {b.get('errors', 0)} -> {r['errors']}")
+        if name == CALIBRATION_ROUTE:
+            continue
+        p95, rps = b["p95_ms"] * speed, b["throughput_rps"] / speed
+        if r["p95_ms"] > p95 * (1 + tolerance) and r["p95_ms"] - p95 > noise_ms:
+            regressions.append(f"{name}: p95 {b['p95_ms']}ms (x{speed:.2f} = {p95:.1f}ms) -> {r['p95_ms']}ms")
+        # Throughput of routes that take a few milliseconds swings with scheduling, so a drop
+        # counts only if mean latency grew past the noise floor too
+        if r["throughput_rps"] < rps * (1 - tolerance) and r["mean_ms"] - b["mean_ms"] * speed > noise_ms:
+            regressions.append(f"{name}: throughput {b['throughput_rps']} (/{speed:.2f} = {rps:.1f}) -> {r['throughput_rps']} rps")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stores", type=int, default=40, help="distinct store locations")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier on fake upstream latency")
+    parser.add_argument("--failure-rate", type=float, default=None, help="injected upstream failure rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="run only routes containing these substrings")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--no-compare", dest="compare", action="store_false")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # Fresh local state so runs are comparable
+    workdir = tempfile.mkdtemp(prefix="greengrow-bench-")
+    os.environ["GREENGROW_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["RASTER_CHIP_DIR"] = os.path.join(workdir, "chips")
+    os.environ["TILE_CACHE_DIR"] = os.path.join(workdir, "tiles")
+    # Coarse chips keep the raster sync jobs the sync scenario enqueues small
+    os.environ["RASTER_CHIP_PIXEL_METERS"] = "200"
+    os.environ.setdefault("DATA_COMMONS_API_KEY", "fake")
+    os.environ["PRECOMPUTE_INTERVAL_SECONDS"] = "0"
+    os.environ["WARMUP"] = "0"
+
+    inject, patch_weather = install(FakeConfig(seed=args.seed).scaled(args.latency_scale, args.failure_rate))
+    patch_weather()
+
+    results = asyncio.run(run(args))
+
+    print(f"{'route':<44} {'req':>5} {'err':>4} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<44} {r['requests']:>5} {r['errors']:>4} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+    print(f"\nupstream calls: {json.dumps(inject.calls, sort_keys=True)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"baseline written to {BASELINE_PATH}")
+        return 0
+
+    if args.compare and os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for r in regressions:
+                print(f"  {r}")
+            return 1
+        print("\nno regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,41 @@
-from .services.intelligence import analyze_seasonal, analyze_growth, get_history, trigger_extraction, generate_stocking_action
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+import time
+_IMPORT_START = time.perf_counter()
+
+from .services.intelligence import (
+    analyze_seasonal, analyze_growth, analyze_batch, get_history, get_location_context, trigger_extraction,
+    generate_stocking_action, generate_stocking_actions, round_trip_stats, all_cache_stats,
+    register_portfolio, refresh_portfolio, get_precomputed, sync_raster_chip, metrics_gauges,
+    stream_store_analysis, warm_up, startup_report, prefetch_context, analyze_rings,
+)
+from .services import ee_scheduler, encoding, jobs, shared_cache, telemetry, static_assets, tiles
+from .services.ee_scheduler import EEQuotaExceeded
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from typing import List, Optional
+import json
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="GreenGrowth Retail Intelligence API")
+# Heavy SDKs are imported lazily; WARMUP=1 initializes the upstream clients in the background at startup
+WARMUP = os.environ.get("WARMUP", "1") != "0"
+_cold_start = {"import_seconds": round(time.perf_counter() - _IMPORT_START, 3), "first_request_seconds": None}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background job workers and the portfolio precompute scheduler
+    jobs.start()
+    if WARMUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    jobs.stop()
+
+app = FastAPI(title="GreenGrowth Retail Intelligence API", lifespan=lifespan)
 
 # Configure CORS for frontend access
 app.add_middleware(
@@ -22,6 +46,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    # Per-request upstream spans are echoed in Server-Timing; route latency goes to /api/metrics
+    spans = telemetry.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    telemetry.observe("http_request", (("route", getattr(route, "path", "unmatched")), ("method", request.method)), elapsed)
+    response.headers["Server-Timing"] = telemetry.server_timing(spans, elapsed)
+    if _cold_start["first_request_seconds"] is None and request.url.path != "/api/startup":
+        _cold_start["first_request_seconds"] = round(elapsed, 3)
+        _cold_start["first_request_path"] = request.url.path
+    return response
+
 class Store(BaseModel):
     id: str
     name: str
@@ -41,31 +80,109 @@ class StockingRequest(BaseModel):
 def read_root():
     return {"message": "Welcome to the GreenGrowth API (Stateless)"}
 
+@app.get("/api/ee/stats")
+def ee_stats_endpoint():
+    # EE round trips per analysis endpoint
+    return round_trip_stats()
+
+@app.get("/api/ee/scheduler")
+def ee_scheduler_endpoint():
+    # Queue depth, active calls, waits and quota retries per priority lane
+    return ee_scheduler.stats()
+
+@app.get("/api/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(telemetry.render_prometheus(metrics_gauges()), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats")
+def cache_stats_endpoint():
+    return all_cache_stats()
+
+@app.get("/api/startup")
+def startup():
+    # Cold-start report: app import time, first-request latency and per-client warm-up timings
+    return {**_cold_start, "warmup_enabled": WARMUP, **startup_report(),
+            "worker": {"pid": os.getpid(), "job_leader": jobs.is_leader(), "shared_cache": shared_cache.SHARED_CACHE or None}}
+
 @app.post("/api/analyze/seasonal")
-def analyze_seasonal_endpoint(store: Store):
+def analyze_seasonal_endpoint(store: Store, budget: Optional[float] = None, accept: Optional[str] = Header(None)):
+    # budget: seconds to wait for upstreams before answering with partial results
+    # accept: application/vnd.greengrow.compact+json or application/msgpack for compact payloads
     print(f"Analyzing Seasonal: {store.name}")
     try:
-         return analyze_seasonal(store.id, store.lat, store.lng, store.name)
+         return encoding.respond(analyze_seasonal(store.id, store.lat, store.lng, store.name, budget), accept)
 
+    except EEQuotaExceeded as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
          print(f"Analysis error: {e}")
          raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/analyze/growth")
-def analyze_growth_endpoint(store: Store):
+def analyze_growth_endpoint(store: Store, budget: Optional[float] = None, accept: Optional[str] = Header(None)):
     print(f"Analyzing Growth: {store.name}")
     try:
-         return analyze_growth(store.id, store.lat, store.lng, store.name)
+         return encoding.respond(analyze_growth(store.id, store.lat, store.lng, store.name, budget), accept)
 
+    except EEQuotaExceeded as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
          print(f"Analysis error: {e}")
          raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/analyze/batch")
+def analyze_batch_endpoint(stores: List[Store], accept: Optional[str] = Header(None)):
+    print(f"Analyzing Batch: {len(stores)} stores")
+    try:
+         return encoding.respond({"results": analyze_batch([(s.id, s.lat, s.lng) for s in stores])}, accept)
+    except EEQuotaExceeded as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+         print(f"Analysis error: {e}")
+         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/analyze/stream")
+def analyze_stream_endpoint(store: Store, format: str = "ndjson"):
+    """
+    Streams every part of a store analysis as it completes, as NDJSON lines
+    ({"event": ..., "data": ...}) or Server-Sent Events with format=sse.
+    """
+    print(f"Streaming Analysis: {store.name}")
+
+    def ndjson():
+        for event, data in stream_store_analysis(store.id, store.lat, store.lng, store.name):
+            yield json.dumps({"event": event, "data": data}) + "\n"
+
+    def sse():
+        for event, data in stream_store_analysis(store.id, store.lat, store.lng, store.name):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @app.post("/api/analyze/history")
-def analyze_history_endpoint(store: Store):
+def analyze_history_endpoint(store: Store, months: int = 6, accept: Optional[str] = Header(None)):
     print(f"Analyzing History: {store.name}")
     try:
-         return get_history(store.id, store.lat, store.lng)
+         return encoding.respond(get_history(store.id, store.lat, store.lng, months), accept)
+    except EEQuotaExceeded as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+         print(f"Analysis error: {e}")
+         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/analyze/rings")
+def analyze_rings_endpoint(store: Store, radii: str = "1,3,5", months: int = 6, accept: Optional[str] = Header(None)):
+    # radii: comma-separated trade-area radii in miles, all computed in one EE evaluation
+    print(f"Analyzing Rings: {store.name}")
+    try:
+         radii_miles = [float(r) for r in radii.split(",") if r.strip()]
+         return encoding.respond(analyze_rings(store.id, store.lat, store.lng, radii_miles, months), accept)
+    except ValueError as e:
+         raise HTTPException(status_code=400, detail=str(e))
+    except EEQuotaExceeded as e:
+         raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
          print(f"Analysis error: {e}")
          raise HTTPException(status_code=500, detail=str(e))
@@ -74,24 +191,77 @@ def analyze_history_endpoint(store: Store):
 def get_location_context_endpoint(store: Store):
     print(f"Fetching Context: {store.name}")
     try:
-         # Import here or better at top if exposed
-         from .services.datacommons import get_location_metrics
-         from .services.weather import get_weather_forecast
-         metrics = get_location_metrics(store.lat, store.lng)
-         weather = get_weather_forecast(store.lat, store.lng)
-         return {**metrics, **weather}
+         return get_location_context(store.lat, store.lng)
     except Exception as e:
          print(f"Context error: {e}")
          raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/tiles/{layer}/{z}/{x}/{y}")
+def get_tile_endpoint(layer: str, z: int, x: int, y: int):
+    # Proxied EE map tiles, cached on disk and shared by every client viewing the layer
+    try:
+        max_age = tiles.max_age(layer)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown layer")
+    try:
+        png = tiles.get_tile(layer, z, x, y)
+    except EEQuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+        print(f"Tile error for {layer}/{z}/{x}/{y}: {e}")
+        raise HTTPException(status_code=502, detail="Tile fetch failed")
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": f"public, max-age={max_age}"})
+
 @app.post("/api/trigger_extraction")
-def trigger_extraction(store: Store):
-    # Stateless trigger
+def trigger_extraction_endpoint(store: Store):
     try:
-        return trigger_extraction(store.id, store.lat, store.lng)
+        return trigger_extraction(store.id, store.lat, store.lng, store.name)
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"GEE Job submission failed: {str(e)}")
 
+@app.post("/api/raster/sync")
+def sync_raster_chip_endpoint(store: Store):
+    # Background download of the store's rasters for the local compute backend
+    return sync_raster_chip(store.id, store.lat, store.lng)
+
+@app.get("/api/jobs")
+def list_jobs_endpoint(status: Optional[str] = None, limit: int = 100):
+    return jobs.list_jobs(status, limit)
+
+@app.get("/api/jobs/{job_id}")
+def get_job_endpoint(job_id: str):
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result_endpoint(job_id: str, accept: Optional[str] = Header(None)):
+    job = jobs.get_job(job_id, with_result=True)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return encoding.respond(job["result"], accept)
+
+@app.post("/api/portfolio")
+def register_portfolio_endpoint(stores: List[Store]):
+    return register_portfolio([s.model_dump() for s in stores])
+
+@app.post("/api/context/prefetch")
+def prefetch_context_endpoint(stores: List[Store]):
+    # Bulk Data Commons load so later /api/context and analysis calls for these stores hit cache
+    return prefetch_context([s.model_dump() for s in stores])
+
+@app.post("/api/portfolio/refresh")
+def refresh_portfolio_endpoint():
+    return refresh_portfolio()
+
+@app.get("/api/results/{store_id}")
+def get_precomputed_endpoint(store_id: str, accept: Optional[str] = Header(None)):
+    # Precomputed seasonal/growth/history signals written by background jobs
+    return encoding.respond(get_precomputed(store_id), accept)
+
 
 
 @app.post("/api/generate_stocking_action")
@@ -108,17 +278,28 @@ def generate_stocking_action_endpoint(request: StockingRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/generate_stocking_action/batch")
+def generate_stocking_actions_endpoint(requests: List[StockingRequest]):
+    try:
+        actions = generate_stocking_actions([r.model_dump() for r in requests])
+        return {"stocking_actions": actions}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
-# Serve static files from the "static" directory
+# Serve the built frontend from the "static" directory, indexed into memory at startup
 if os.path.exists("static"):
-    app.mount("/assets", StaticFiles(directory="static/assets"), name="assets")
+    _static = static_assets.load_static("static")
 
     @app.get("/{full_path:path}")
-    async def serve_frontend(full_path: str):
-        path = os.path.join("static", full_path)
-        if os.path.exists(path) and os.path.isfile(path):
-            return FileResponse(path)
-        return FileResponse("static/index.html")
+    async def serve_frontend(full_path: str, request: Request):
+        asset = _static.get(full_path)
+        if asset is None:
+            if full_path.startswith("assets/"):
+                raise HTTPException(status_code=404, detail="Not Found")
+            # SPA routes fall back to index.html
+            asset = _static["index.html"]
+        return static_assets.serve(asset, request.headers)
 
 if __name__ == "__main__":
     import uvicorn
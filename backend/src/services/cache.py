@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import shared_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_caches = []
+
+def snap(value: float, precision: int = 3):
+    """
+    Rounds a coordinate so nearby lookups share a cache key.
+    3 decimals is roughly 110 m at the equator.
+    """
+    return round(float(value), precision)
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with per-entry TTL, LRU eviction and hit/miss counters.
+    When a shared backend is configured (SHARED_CACHE), local misses fall through to it
+    and writes go to both, so worker processes share what any one of them fetched.
+    """
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, shared: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        _caches.append(self)
+
+    def _shared_key(self, key):
+        return f"{self.name}:{json.dumps(key, default=str)}"
+
+    def _shared_get(self, key):
+        backend = shared_cache.backend() if self.shared else None
+        if backend is None:
+            return None
+        try:
+            return backend.get(self._shared_key(key))
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {self.name}: {e}")
+            return None
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+        found = self._shared_get(key)
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return default
+            # Keep a local copy until the shared entry expires
+            value, expires_at = found
+            self._store(key, value, expires_at)
+            self.hits += 1
+            self.shared_hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._store(key, value, expires_at)
+        backend = shared_cache.backend() if self.shared else None
+        if backend is not None:
+            try:
+                backend.set(self._shared_key(key), value, expires_at)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed for {self.name}: {e}")
+
+    def _store(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+def _reset_after_fork():
+    # A lock held by another thread at fork time would stay locked forever in the child
+    for cache in _caches:
+        cache._lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
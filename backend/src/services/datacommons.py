@@ -1,113 +1,227 @@
-import datacommons_client
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import TTLCache, snap
+from .lazy import lazy_import
+from .singleflight import coalesce
+from .telemetry import span
+
+datacommons_client = lazy_import("datacommons_client")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Variables of interest
+VARIABLES = [
+    "Count_Person",
+    "Median_Income_Person",
+    "UnemploymentRate_Person"
+]
+
+# A store's containing place effectively never changes, so keep resolutions for a week.
+# Demographic variables update at most yearly; a day keeps us well within that.
+_dcid_cache = TTLCache("dc_dcid", maxsize=10000, ttl=7 * 24 * 3600)
+_metrics_cache = TTLCache("dc_metrics", maxsize=2000, ttl=24 * 3600)
+
+# Portfolio prefetch: distinct DCIDs per observation.fetch call, and parallel coordinate resolves
+DC_BULK_CHUNK = int(os.environ.get("DC_BULK_CHUNK", "100"))
+DC_RESOLVE_WORKERS = int(os.environ.get("DC_RESOLVE_WORKERS", "8"))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns a process-wide DataCommonsClient, or None if no API key is configured.
+    """
+    global _client
+    if _client is None:
+        api_key = os.environ.get("DATA_COMMONS_API_KEY")
+        if not api_key:
+            return None
+        with _client_lock:
+            if _client is None:
+                _client = datacommons_client.DataCommonsClient(api_key=api_key)
+    return _client
+
+def _reset_after_fork():
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def cache_stats():
+    return [_dcid_cache.stats(), _metrics_cache.stats()]
+
+def _cand_field(cand, field):
+    # cand might be object or dict
+    return getattr(cand, field, cand.get(field) if isinstance(cand, dict) else None)
+
+def resolve_dcid(client, lat: float, lng: float):
+    """
+    Resolves a lat/lng to the DCID of its City (falling back to County, then the first candidate).
+    Cached on snapped coordinates.
+    """
+    key = (snap(lat), snap(lng))
+    cached = _dcid_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # fetch_dcid_by_coordinates returns candidates
+    with span("dc_resolve"):
+        resolve_resp = client.resolve.fetch_dcid_by_coordinates(latitude=lat, longitude=lng)
+
+    candidates = []
+    # Check if it has entities attribute
+    if resolve_resp and hasattr(resolve_resp, 'entities') and resolve_resp.entities:
+        # Check if entities[0] has candidates
+        candidates = resolve_resp.entities[0].candidates
+    elif resolve_resp and isinstance(resolve_resp, dict) and 'entities' in resolve_resp:
+         # Fallback for dict
+         candidates = resolve_resp['entities'][0].get('candidates', [])
+
+    if not candidates:
+        return None
+
+    # Prioritize City then County
+    target_dcid = None
+    for wanted in ('City', 'County'):
+        for cand in candidates:
+            if _cand_field(cand, 'dominantType') == wanted:
+                target_dcid = _cand_field(cand, 'dcid')
+                break
+        if target_dcid:
+            break
+
+    if not target_dcid:
+        # Fallback to first one
+        target_dcid = _cand_field(candidates[0], 'dcid')
+
+    if target_dcid:
+        logger.info(f"Resolved {lat},{lng} to DCID: {target_dcid}")
+        _dcid_cache.set(key, target_dcid)
+    return target_dcid
+
+def _parse_observations(obs_resp, dcids):
+    """
+    Latest value of each variable per entity, as {dcid: {"dcid": dcid, var: value, ...}}.
+    """
+    by_dcid = {dcid: {"dcid": dcid} for dcid in dcids}
+
+    # Parse response
+    # The structure is usually:
+    # { 'byVariable': { var: { 'byEntity': { dcid: { 'orderedFacets': [ { 'observations': [...] } ] } } } } }
+    if obs_resp:
+         # Convert to dict tree for easier traversal
+         resp_dict = obs_resp.to_dict() if hasattr(obs_resp, 'to_dict') else obs_resp
+         # Also handling case where it might be a Pydantic model without to_dict but with dict()
+         if not isinstance(resp_dict, dict) and hasattr(obs_resp, 'dict'):
+             resp_dict = obs_resp.dict()
+
+         if isinstance(resp_dict, dict) and 'byVariable' in resp_dict and resp_dict['byVariable']:
+             for var_name, var_data in resp_dict['byVariable'].items():
+                for dcid, entity_data in (var_data.get('byEntity') or {}).items():
+                     if dcid not in by_dcid:
+                         continue
+                     # Check for orderedFacets
+                     if 'orderedFacets' in entity_data and entity_data['orderedFacets']:
+                         facet = entity_data['orderedFacets'][0]
+                         if 'observations' in facet and facet['observations']:
+                             val = facet['observations'][0].get('value')
+                             if val is not None:
+                                 by_dcid[dcid][var_name] = val
+    return by_dcid
+
+def fetch_metrics(client, dcid: str):
+    """
+    Fetches the latest value of each variable in VARIABLES for a DCID. Cached per DCID.
+    """
+    cached = _metrics_cache.get(dcid)
+    if cached is not None:
+        return dict(cached)
+
+    with span("dc_observation"):
+        obs_resp = client.observation.fetch(entity_dcids=[dcid], variable_dcids=VARIABLES)
+    metrics = _parse_observations(obs_resp, [dcid])[dcid]
+
+    _metrics_cache.set(dcid, metrics)
+    return dict(metrics)
+
+@coalesce("metrics", lambda lat, lng: (snap(lat), snap(lng)))
 def get_location_metrics(lat: float, lng: float):
     """
     Resolves a lat/lng to a DCID and fetches relevant socio-economic metrics.
     Returns a dictionary of metrics or empty dict if failed.
     """
-    api_key = os.environ.get("DATA_COMMONS_API_KEY")
-    if not api_key:
+    client = get_client()
+    if client is None:
         logger.warning("DATA_COMMONS_API_KEY not found in environment.")
         return {}
 
     try:
-        client = datacommons_client.DataCommonsClient(api_key=api_key)
-        
         # 1. Resolve to DCID
-        # fetch_dcid_by_coordinates returns candidates
-        # We want City or County
-        resolve_resp = client.resolve.fetch_dcid_by_coordinates(latitude=lat, longitude=lng)
-        
-        candidates = []
-        # Check if it has entities attribute
-        if resolve_resp and hasattr(resolve_resp, 'entities') and resolve_resp.entities:
-            # Check if entities[0] has candidates
-            candidates = resolve_resp.entities[0].candidates
-        elif resolve_resp and isinstance(resolve_resp, dict) and 'entities' in resolve_resp:
-             # Fallback for dict
-             candidates = resolve_resp['entities'][0].get('candidates', [])
-        
-        if not candidates:
-            return {}
-            
-        # Prioritize City then County
-        target_dcid = None
-        target_name = "Location"
-        
-        for cand in candidates:
-            # cand might be object or dict
-            dtype = getattr(cand, 'dominantType', cand.get('dominantType') if isinstance(cand, dict) else None)
-            dcid = getattr(cand, 'dcid', cand.get('dcid') if isinstance(cand, dict) else None)
-            
-            if dtype == 'City':
-                target_dcid = dcid
-                break
-        
-        if not target_dcid:
-            for cand in candidates:
-                dtype = getattr(cand, 'dominantType', cand.get('dominantType') if isinstance(cand, dict) else None)
-                dcid = getattr(cand, 'dcid', cand.get('dcid') if isinstance(cand, dict) else None)
-                if dtype == 'County':
-                    target_dcid = dcid
-                    break
-        
-        if not target_dcid:
-            # Fallback to first one
-            target_dcid = getattr(candidates[0], 'dcid', candidates[0].get('dcid') if isinstance(candidates[0], dict) else None)
-
+        target_dcid = resolve_dcid(client, lat, lng)
         if not target_dcid:
             return {}
 
-        logger.info(f"Resolved {lat},{lng} to DCID: {target_dcid}")
-
         # 2. Fetch Metrics
-        # Variables of interest
-        variables = [
-            "Count_Person",
-            "Median_Income_Person",
-            "UnemploymentRate_Person"
-        ]
-        
-        # client.observation.fetch(entity_dcids=[dcid], variable_dcids=[...])
-        # Returns: {'observations': [{'variable': 'Count_Person', 'entity': 'geoId/0649670', 'measuredValue': 80436.0, ...}]} 
-        # structure might vary, let's look at response carefully or use helper
-        obs_resp = client.observation.fetch(entity_dcids=[target_dcid], variable_dcids=variables)
-        
-        metrics = {"dcid": target_dcid}
-        
-        # Parse response
-        # The structure is usually:
-        # { 'observations': [ { 'variable': ..., 'entity': ..., 'measuredValue': ... } ] }
-        # Or sometimes nested differently. 
-        # Let's assume standard V2 response format.
-        
-        if obs_resp:
-             # Convert to dict tree for easier traversal
-             resp_dict = obs_resp.to_dict() if hasattr(obs_resp, 'to_dict') else obs_resp
-             # Also handling case where it might be a Pydantic model without to_dict but with dict()
-             if not isinstance(resp_dict, dict) and hasattr(obs_resp, 'dict'):
-                 resp_dict = obs_resp.dict()
-
-             if isinstance(resp_dict, dict) and 'byVariable' in resp_dict and resp_dict['byVariable']:
-                 for var_name, var_data in resp_dict['byVariable'].items():
-                    if 'byEntity' in var_data and target_dcid in var_data['byEntity']:
-                         entity_data = var_data['byEntity'][target_dcid]
-                         # Check for orderedFacets
-                         if 'orderedFacets' in entity_data and entity_data['orderedFacets']:
-                             facet = entity_data['orderedFacets'][0]
-                             if 'observations' in facet and facet['observations']:
-                                 val = facet['observations'][0].get('value')
-                                 if val is not None:
-                                     metrics[var_name] = val
-        
-        return metrics
+        return fetch_metrics(client, target_dcid)
 
     except Exception as e:
         logger.error(f"Data Commons Error: {e}")
         return {}
+
+def prefetch_location_metrics(coords):
+    """
+    Loads metrics for many (lat, lng) pairs into the caches so later per-store lookups are local.
+    Coordinates are deduplicated on their snapped cell, stores that resolve to the same place
+    share one DCID, and observations for all uncached DCIDs are fetched DC_BULK_CHUNK at a time.
+    """
+    client = get_client()
+    if client is None:
+        logger.warning("DATA_COMMONS_API_KEY not found in environment.")
+        return {"status": "skipped", "stores": len(coords)}
+
+    cells = list(dict.fromkeys((snap(lat), snap(lng)) for lat, lng in coords))
+
+    def resolve(cell):
+        try:
+            return resolve_dcid(client, *cell)
+        except Exception as e:
+            logger.error(f"Data Commons resolve failed for {cell}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=DC_RESOLVE_WORKERS) as pool:
+        dcids = [d for d in pool.map(resolve, cells) if d]
+
+    distinct = list(dict.fromkeys(dcids))
+    missing = [d for d in distinct if _metrics_cache.get(d) is None]
+    calls, failed = 0, 0
+    for i in range(0, len(missing), DC_BULK_CHUNK):
+        chunk = missing[i:i + DC_BULK_CHUNK]
+        try:
+            with span("dc_observation_bulk"):
+                obs_resp = client.observation.fetch(entity_dcids=chunk, variable_dcids=VARIABLES)
+            calls += 1
+        except Exception as e:
+            logger.error(f"Data Commons bulk fetch of {len(chunk)} entities failed: {e}")
+            failed += len(chunk)
+            continue
+        for dcid, metrics in _parse_observations(obs_resp, chunk).items():
+            _metrics_cache.set(dcid, metrics)
+
+    logger.info(f"Prefetched Data Commons metrics for {len(coords)} stores: "
+                f"{len(cells)} cells, {len(distinct)} places, {calls} bulk calls")
+    return {
+        "status": "ok",
+        "stores": len(coords),
+        "cells": len(cells),
+        "places": len(distinct),
+        "fetched": len(missing) - failed,
+        "failed": failed,
+        "observation_calls": calls,
+    }
@@ -0,0 +1,42 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Per-request time budget. The absolute deadline (time.monotonic()) lives in a context
+# variable, so fan-out threads started with copy_context() see the same deadline and
+# every upstream call can cap its own timeout by what is left.
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+@contextmanager
+def within(seconds: float):
+    """
+    Sets a deadline `seconds` from now for the block (never extends an earlier one).
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining():
+    """
+    Seconds left before the deadline, or None if no deadline is set.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+def timeout(default: float):
+    """
+    An upstream timeout: `default`, capped by the time left before the deadline.
+    """
+    left = remaining()
+    return default if left is None else min(default, left)
+
+def check(what: str = "request"):
+    if remaining() == 0.0:
+        raise DeadlineExceeded(f"{what} exceeded its deadline")
@@ -1,85 +1,184 @@
-import ee
+import contextvars
+import datetime
+import functools
+import itertools
+import math
 import os
+import threading
 import time
 
+from . import ee_scheduler
+from .lazy import lazy_import
+from .singleflight import coalesce
+from .telemetry import span
+from .store import (
+    growth_key, get_growth_result, put_growth_result, get_tile_url, put_tile_url,
+    history_key, get_history_sync, put_ndvi_observations, query_ndvi,
+)
+
+ee = lazy_import("ee")
+
 _INITIALIZED = False
+_init_lock = threading.Lock()
 
 def init_ee():
     global _INITIALIZED
-    if not _INITIALIZED:
-        project = os.environ.get("GCP_PROJECT")
-        try:
-            if project:
-                ee.Initialize(project=project)
-            else:
-                ee.Initialize() # Falls back to local auth credentials
-            _INITIALIZED = True
-        except Exception as e:
-            print(f"Error initializing Earth Engine. Did you run 'earthengine authenticate'? {e}")
-            raise
+    if _INITIALIZED:
+        return
+    # Startup warm-up and the first requests may race to initialize
+    with _init_lock:
+        if not _INITIALIZED:
+            project = os.environ.get("GCP_PROJECT")
+            try:
+                if project:
+                    ee.Initialize(project=project)
+                else:
+                    ee.Initialize() # Falls back to local auth credentials
+                _INITIALIZED = True
+            except Exception as e:
+                print(f"Error initializing Earth Engine. Did you run 'earthengine authenticate'? {e}")
+                raise
 
-def analyze_seasonal_gee(lat: float, lng: float):
-    init_ee()
-    
-    poi = ee.Geometry.Point([lng, lat])
-    buffer = poi.buffer(8046)
-    
-    past_start = ee.Date('2020-06-01')
-    past_end = ee.Date('2020-09-01')
-    current_start = ee.Date('2025-06-01')
-    current_end = ee.Date('2025-09-01')
-    
-    # Sentinel-2 for NDVI
-    # Note: original analyze_seasonal logic was:
-    end_date = ee.Date(round(time.time() * 1000))
-    start_date = end_date.advance(-30, 'day')
+def _reset_after_fork():
+    # A forked worker must authenticate its own EE session rather than reuse the parent's
+    global _INITIALIZED, _init_lock, _stats_lock
+    _INITIALIZED = False
+    _init_lock = threading.Lock()
+    _stats_lock = threading.Lock()
 
-    collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                  .filterBounds(buffer)
-                  .filterDate(start_date, end_date)
-                  .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30)))
-    
-    recent_image = collection.median()
-    ndvi = recent_image.normalizedDifference(['B8', 'B4']).rename('NDVI')
+os.register_at_fork(after_in_child=_reset_after_fork)
 
-    # Dynamic World for 'Built' context
-    dw_collection = (ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1')
-                  .filterBounds(buffer)
-                  .filterDate(start_date, end_date))
-    dw_image = dw_collection.median()
-    dw_built = dw_image.select('built')
+# --- Execution layer ---
+# Every blocking call to EE goes through evaluate()/get_map_id() so round trips can be
+# counted per endpoint and queued by the quota-aware scheduler. evaluate() packs all
+# server-side values into one ee.Dictionary.
 
-    # Statistics
-    stats = ndvi.reduceRegion(
-        reducer=ee.Reducer.mean(),
-        geometry=buffer,
-        scale=500,
-        maxPixels=1e9
-    ).getInfo()
+_round_trips = contextvars.ContextVar("ee_round_trips", default=None)
+_round_trip_stats = {}
+_stats_lock = threading.Lock()
 
-    # Geo Points for impact
-    is_built = dw_built.gt(0.2)
-    built_and_yards = is_built.focalMax(10, 'circle', 'pixels')
-    lawn_mask = ndvi.gt(0.3).And(built_and_yards.eq(1))
-    ndvi_class = lawn_mask.rename('class')
-    
-    ndvi_sample = ndvi_class.stratifiedSample(
-        numPoints=15, classBand='class', region=buffer, scale=250, geometries=True
-    ).getInfo()
-    ndvi_points = [{"lat": f.get('geometry', {}).get('coordinates', [0,0])[1], "lng": f.get('geometry', {}).get('coordinates', [0,0])[0]} 
-                   for f in ndvi_sample.get('features', []) if f.get('geometry') and f.get('properties', {}).get('class') == 1]
+def _count_round_trip():
+    counter = _round_trips.get()
+    if counter is not None:
+        counter[0] += 1
 
-    ndvi_val = stats.get('NDVI', 0)
+def evaluate(values: dict):
+    """
+    Evaluates a dict of server-side EE objects in a single getInfo round trip.
+    """
+    _count_round_trip()
+    return ee_scheduler.run(_get_info, ee.Dictionary(values))
 
-    # Visualization
-    ndvi_vis = {
-        'min': 0,
-        'max': 1,
-        'palette': ['white', 'green']
-    }
-    map_id_dict = ndvi.clip(buffer).getMapId(ndvi_vis)
-    tile_url = map_id_dict['tile_fetcher'].url_format
+def get_map_id(image, vis_params):
+    _count_round_trip()
+    return ee_scheduler.run(_get_map_id, image, vis_params)
+
+def compute_pixels(request: dict):
+    _count_round_trip()
+    return ee_scheduler.run(_compute_pixels, request)
+
+def _get_info(obj):
+    with span("ee_getinfo"):
+        return obj.getInfo()
+
+def _get_map_id(image, vis_params):
+    with span("ee_getmapid"):
+        return image.getMapId(vis_params)
+
+def _compute_pixels(request):
+    with span("ee_computepixels"):
+        return ee.data.computePixels(request)
+
+def track_round_trips(endpoint: str):
+    """
+    Decorator recording how many EE round trips each call of an analysis makes.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            counter = [0]
+            token = _round_trips.set(counter)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _round_trips.reset(token)
+                with _stats_lock:
+                    s = _round_trip_stats.setdefault(endpoint, {"calls": 0, "round_trips": 0, "max": 0, "last": 0})
+                    s["calls"] += 1
+                    s["round_trips"] += counter[0]
+                    s["last"] = counter[0]
+                    s["max"] = max(s["max"], counter[0])
+        return wrapper
+    return decorator
 
+def round_trip_stats():
+    with _stats_lock:
+        return {
+            name: {**s, "mean": round(s["round_trips"] / s["calls"], 2) if s["calls"] else 0}
+            for name, s in _round_trip_stats.items()
+        }
+
+BUFFER_METERS = 8046  # 5 miles
+BATCH_CHUNK_SIZE = 100
+GROWTH_SCALE = 10
+# "full" always reduces at GROWTH_SCALE; "adaptive" first estimates from a random sample of
+# GROWTH_SCALE pixels, about one per GROWTH_SAMPLE_SPACING x GROWTH_SAMPLE_SPACING m cell,
+# and reduces in full only when the estimate is within its error bound of a bucket threshold.
+# Both read the mask at GROWTH_SCALE; responses say which estimate was used.
+GROWTH_RESOLUTION_MODE = os.environ.get("GROWTH_RESOLUTION_MODE", "full")
+GROWTH_SAMPLE_SPACING = int(os.environ.get("GROWTH_SAMPLE_SPACING", "100"))
+GROWTH_SAMPLE_SEED = 0
+GROWTH_ERROR_Z = 3.0
+GROWTH_THRESHOLDS_HA = (400, 1000)
+# Fixed comparison windows for built-up change; results for a location never change.
+GROWTH_PAST = ('2020-06-01', '2020-09-01')
+GROWTH_CURRENT = ('2025-06-01', '2025-09-01')
+GROWTH_WINDOWS = f"{GROWTH_PAST[0]}/{GROWTH_PAST[1]}:{GROWTH_CURRENT[0]}/{GROWTH_CURRENT[1]}"
+HISTORY_MONTHS = 6
+# New Sentinel-2 scenes arrive every few days; don't ask EE more often than this.
+HISTORY_REFRESH_SECONDS = 6 * 3600
+# Scenes can be ingested a few days after acquisition, so re-scan this far back.
+HISTORY_LOOKBACK_DAYS = 5
+# Map layers are served through the backend tile proxy (/api/tiles) so map IDs and tiles
+# are shared across users; TILE_PROXY=0 hands the browser EE's own tile URL instead.
+TILE_PROXY = os.environ.get("TILE_PROXY", "1") != "0"
+TILE_URL_BASE = os.environ.get("TILE_URL_BASE", "/api/tiles")
+LAYERS = ("seasonal", "growth")
+
+def _recent_window():
+    end_date = ee.Date(round(time.time() * 1000))
+    return end_date.advance(-30, 'day'), end_date
+
+def _s2_collection(region, start_date, end_date):
+    # Sentinel-2 for NDVI
+    return (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+            .filterBounds(region)
+            .filterDate(start_date, end_date)
+            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30)))
+
+def _recent_ndvi(region, start_date, end_date):
+    recent_image = _s2_collection(region, start_date, end_date).median()
+    return recent_image.normalizedDifference(['B8', 'B4']).rename('NDVI')
+
+def _new_construction(region):
+    past_start = ee.Date(GROWTH_PAST[0])
+    past_end = ee.Date(GROWTH_PAST[1])
+    current_start = ee.Date(GROWTH_CURRENT[0])
+    current_end = ee.Date(GROWTH_CURRENT[1])
+
+    def get_built_mask(start, end):
+        dw = (ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1')
+              .filterBounds(region)
+              .filterDate(start, end)
+              .select('label')
+              .mode())
+        return dw.eq(6) # 6 is 'built'
+
+    built_old = get_built_mask(past_start, past_end)
+    built_new = get_built_mask(current_start, current_end)
+    return built_new.gt(built_old).rename('class')
+
+def seasonal_signal(ndvi_val, tile_url, ndvi_points):
     if ndvi_val is not None and ndvi_val > 0.4:
          return {
             "type": "Seasonal",
@@ -103,7 +202,7 @@ def analyze_seasonal_gee(lat: float, lng: float):
     else:
          return {
             "type": "Seasonal",
-            "metric": f"Dormant (NDVI {ndvi_val:.2f})",
+            "metric": f"Dormant (NDVI {(ndvi_val or 0):.2f})",
             "market_signal": "Winter conditions",
             "stocking_action": None,
             "intensity": "Low",
@@ -111,45 +210,7 @@ def analyze_seasonal_gee(lat: float, lng: float):
             "geo_points": []
          }
 
-def analyze_growth_gee(lat: float, lng: float):
-    init_ee()
-    
-    poi = ee.Geometry.Point([lng, lat])
-    buffer = poi.buffer(8046)
-    
-    past_start = ee.Date('2020-06-01')
-    past_end = ee.Date('2020-09-01')
-    current_start = ee.Date('2025-06-01')
-    current_end = ee.Date('2025-09-01')
-    
-    def get_built_mask(start, end):
-        dw = (ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1')
-              .filterBounds(buffer)
-              .filterDate(start, end)
-              .select('label')
-              .mode())
-        return dw.eq(6) # 6 is 'built'
-
-    built_old = get_built_mask(past_start, past_end)
-    built_new = get_built_mask(current_start, current_end)
-    
-    new_construction = built_new.gt(built_old).rename('class').clip(buffer)
-    
-    pixel_area = ee.Image.pixelArea()
-    hotspot_area = new_construction.multiply(pixel_area).reduceRegion(
-        reducer=ee.Reducer.sum(),
-        geometry=buffer,
-        scale=10, 
-        maxPixels=1e9
-    ).getInfo()
-
-    hotspot_sq_meters = hotspot_area.get('class', 0)
-    hotspot_ha = hotspot_sq_meters / 10000 if hotspot_sq_meters else 0
-    
-    masked_construction = new_construction.updateMask(new_construction)
-    map_id_dict = masked_construction.getMapId({'palette': ['#FF4500']})
-    tile_url = map_id_dict['tile_fetcher'].url_format
-
+def growth_signal(hotspot_ha, tile_url):
     if hotspot_ha > 1000:
          return {
             "type": "Growth",
@@ -181,20 +242,289 @@ def analyze_growth_gee(lat: float, lng: float):
             "geo_points": []
          }
 
-def analyze_history(store_id: str, lat: float, lng: float):
-    init_ee()
-    
+NDVI_VIS = {
+    'min': 0,
+    'max': 1,
+    'palette': ['white', 'green']
+}
+
+def _seasonal_exprs(lat: float, lng: float):
+    """
+    Server-side pieces of the seasonal analysis: (buffer, ndvi image, stats, sample).
+    """
     poi = ee.Geometry.Point([lng, lat])
-    buffer = poi.buffer(8046)
-    
-    end_date = ee.Date(round(time.time() * 1000))
-    history_start = end_date.advance(-6, 'month')
+    buffer = poi.buffer(BUFFER_METERS)
     
-    history_collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+    start_date, end_date = _recent_window()
+    ndvi = _recent_ndvi(buffer, start_date, end_date)
+
+    # Dynamic World for 'Built' context
+    dw_collection = (ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1')
                   .filterBounds(buffer)
-                  .filterDate(history_start, end_date)
-                  .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 30)))
+                  .filterDate(start_date, end_date))
+    dw_image = dw_collection.median()
+    dw_built = dw_image.select('built')
+
+    # Statistics
+    stats = ndvi.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=buffer,
+        scale=500,
+        maxPixels=1e9
+    )
+
+    # Geo Points for impact
+    is_built = dw_built.gt(0.2)
+    built_and_yards = is_built.focalMax(10, 'circle', 'pixels')
+    lawn_mask = ndvi.gt(0.3).And(built_and_yards.eq(1))
+    ndvi_class = lawn_mask.rename('class')
     
+    sample = ndvi_class.stratifiedSample(
+        numPoints=15, classBand='class', region=buffer, scale=250, geometries=True
+    )
+    return buffer, ndvi, stats, sample
+
+def _sample_points(ndvi_sample):
+    return [{"lat": f.get('geometry', {}).get('coordinates', [0,0])[1], "lng": f.get('geometry', {}).get('coordinates', [0,0])[0]} 
+            for f in (ndvi_sample or {}).get('features', []) if f.get('geometry') and f.get('properties', {}).get('class') == 1]
+
+@coalesce("seasonal", lambda lat, lng: (round(lat, 4), round(lng, 4)))
+@track_round_trips("seasonal")
+def analyze_seasonal_gee(lat: float, lng: float):
+    init_ee()
+    buffer, ndvi, stats, sample = _seasonal_exprs(lat, lng)
+
+    result = evaluate({'stats': stats, 'sample': sample})
+    stats = result.get('stats') or {}
+    ndvi_points = _sample_points(result.get('sample'))
+
+    ndvi_val = stats.get('NDVI', 0)
+
+    # Visualization
+    tile_url = layer_tile_url("seasonal", lat, lng, ndvi.clip(buffer), NDVI_VIS)
+
+    return seasonal_signal(ndvi_val, tile_url, ndvi_points)
+
+@track_round_trips("seasonal_ndvi")
+def seasonal_ndvi_gee(lat: float, lng: float):
+    """
+    Only the NDVI mean, so streaming clients get the classification before the layers.
+    """
+    init_ee()
+    _, _, stats, _ = _seasonal_exprs(lat, lng)
+    return (evaluate({'stats': stats}).get('stats') or {}).get('NDVI', 0)
+
+@track_round_trips("seasonal_layers")
+def seasonal_layers_gee(lat: float, lng: float):
+    """
+    Tile URL and lawn sample points for the seasonal layer: (tile_url, points).
+    """
+    init_ee()
+    buffer, ndvi, _, sample = _seasonal_exprs(lat, lng)
+    ndvi_points = _sample_points(evaluate({'sample': sample}).get('sample'))
+    return layer_tile_url("seasonal", lat, lng, ndvi.clip(buffer), NDVI_VIS), ndvi_points
+
+def _hotspot_ha_full(new_construction, buffer):
+    pixel_area = ee.Image.pixelArea()
+    hotspot_area = evaluate({'area': new_construction.multiply(pixel_area).reduceRegion(
+        reducer=ee.Reducer.sum(),
+        geometry=buffer,
+        scale=GROWTH_SCALE, 
+        maxPixels=1e9
+    )}).get('area') or {}
+
+    hotspot_sq_meters = hotspot_area.get('class', 0)
+    return hotspot_sq_meters / 10000 if hotspot_sq_meters else 0
+
+def _hotspot_ha_coarse(new_construction, buffer):
+    """
+    Estimates new-construction hectares from a simple random sample of GROWTH_SCALE pixels.
+    The mask is sampled at its native resolution rather than reduced at a coarser scale,
+    where EE's pyramiding would average sparse hotspots away. Each sample is then an
+    unbiased Bernoulli draw, so the area is (fraction flagged) x (buffer area) with a
+    z-sigma binomial error bound.
+    """
+    buffer_ha = math.pi * BUFFER_METERS ** 2 / 10000
+    samples = new_construction.sample(
+        region=buffer,
+        scale=GROWTH_SCALE,
+        numPixels=int(buffer_ha * 10000 / GROWTH_SAMPLE_SPACING ** 2),
+        seed=GROWTH_SAMPLE_SEED,
+        geometries=False,
+    )
+    coarse = evaluate({'coarse': samples.reduceColumns(
+        reducer=ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True),
+        selectors=['class'],
+    )}).get('coarse') or {}
+
+    p = coarse.get('mean') or 0
+    n = coarse.get('count') or 0
+    if not n:
+        return 0, math.inf
+    bound = GROWTH_ERROR_Z * buffer_ha * math.sqrt(max(p * (1 - p), 1 / n) / n)
+    return p * buffer_ha, bound
+
+def growth_hectares(new_construction, buffer, mode: str = None):
+    """
+    Returns (hectares, estimate used: "sampled" or "full", error bound in hectares).
+    'adaptive' only reduces the full mask when the sampled estimate could fall
+    on either side of a classification threshold.
+    """
+    mode = mode or GROWTH_RESOLUTION_MODE
+    if mode == "adaptive":
+        estimate, bound = _hotspot_ha_coarse(new_construction, buffer)
+        if all(abs(estimate - t) > bound for t in GROWTH_THRESHOLDS_HA):
+            return estimate, "sampled", bound
+    return _hotspot_ha_full(new_construction, buffer), "full", 0.0
+
+GROWTH_VIS = {'palette': ['#FF4500']}
+
+def _growth_layer(lat: float, lng: float):
+    buffer = ee.Geometry.Point([lng, lat]).buffer(BUFFER_METERS)
+    new_construction = _new_construction(buffer).clip(buffer)
+    return new_construction.updateMask(new_construction)
+
+def layer_id(kind: str, lat: float, lng: float):
+    return f"{kind}_{round(lat, 4)}_{round(lng, 4)}"
+
+def parse_layer_id(layer: str):
+    """
+    (kind, lat, lng) for a layer id; raises ValueError if it isn't one.
+    """
+    kind, lat, lng = layer.split("_")
+    if kind not in LAYERS:
+        raise ValueError(f"Unknown layer: {kind}")
+    return kind, float(lat), float(lng)
+
+def layer_url_format(kind: str, lat: float, lng: float, image=None, vis_params=None, refresh: bool = False):
+    """
+    EE tile URL template for a layer. Map IDs are kept in the store and reused until they
+    expire; refresh=True mints a new one (e.g. after EE rejected the stored one).
+    """
+    key = f"layer:{layer_id(kind, lat, lng)}"
+    if not refresh:
+        url = get_tile_url(key)
+        if url:
+            return url
+    init_ee()
+    if image is None:
+        if kind == "seasonal":
+            buffer, ndvi, _, _ = _seasonal_exprs(lat, lng)
+            image, vis_params = ndvi.clip(buffer), NDVI_VIS
+        else:
+            image, vis_params = _growth_layer(lat, lng), GROWTH_VIS
+    url = get_map_id(image, vis_params)['tile_fetcher'].url_format
+    put_tile_url(key, url)
+    return url
+
+def layer_tile_url(kind: str, lat: float, lng: float, image=None, vis_params=None):
+    """
+    The tile URL template handed to the browser for a layer.
+    """
+    if TILE_PROXY:
+        # The proxy mints map IDs on the first tile request, so analyses skip getMapId entirely
+        return f"{TILE_URL_BASE}/{layer_id(kind, lat, lng)}/{{z}}/{{x}}/{{y}}"
+    return layer_url_format(kind, lat, lng, image, vis_params)
+
+def _growth_result_key(lat: float, lng: float, estimate: str):
+    # Sampled estimates are kept apart from exact full reductions of the same mask
+    windows = GROWTH_WINDOWS if estimate == "full" else f"{GROWTH_WINDOWS}:{estimate}"
+    return growth_key(lat, lng, BUFFER_METERS, GROWTH_SCALE, windows)
+
+@coalesce("growth", lambda lat, lng: (round(lat, 4), round(lng, 4)))
+@track_round_trips("growth")
+def analyze_growth_gee(lat: float, lng: float):
+    hotspot_ha, estimate = None, None
+    estimates = ["full", "sampled"] if GROWTH_RESOLUTION_MODE == "adaptive" else ["full"]
+    for e in estimates:
+        hotspot_ha = get_growth_result(_growth_result_key(lat, lng, e))
+        if hotspot_ha is not None:
+            estimate = e
+            break
+
+    if hotspot_ha is None:
+        init_ee()
+
+        poi = ee.Geometry.Point([lng, lat])
+        buffer = poi.buffer(BUFFER_METERS)
+
+        new_construction = _new_construction(buffer).clip(buffer)
+
+        hotspot_ha, estimate, _ = growth_hectares(new_construction, buffer)
+        put_growth_result(_growth_result_key(lat, lng, estimate),
+                          lat, lng, BUFFER_METERS, GROWTH_SCALE, GROWTH_WINDOWS, hotspot_ha)
+
+    # The Low bucket does not show a layer, so it needs no map ID
+    tile_url = layer_tile_url("growth", lat, lng) if hotspot_ha >= 400 else None
+    return {**growth_signal(hotspot_ha, tile_url), "resolution_m": GROWTH_SCALE, "estimate": estimate}
+
+def _analyze_batch_chunk(stores):
+    buffers = ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point([lng, lat]).buffer(BUFFER_METERS), {'store_id': store_id})
+        for store_id, lat, lng in stores
+    ])
+    region = buffers.geometry()
+
+    start_date, end_date = _recent_window()
+    ndvi = _recent_ndvi(region, start_date, end_date)
+    ndvi_fc = ndvi.reduceRegions(
+        collection=buffers,
+        reducer=ee.Reducer.mean().setOutputs(['NDVI']),
+        scale=500,
+    )
+
+    area = _new_construction(region).multiply(ee.Image.pixelArea())
+    growth_fc = area.reduceRegions(
+        collection=buffers,
+        reducer=ee.Reducer.sum().setOutputs(['class']),
+        scale=GROWTH_SCALE,
+    )
+
+    # Both reductions are evaluated server-side in a single round trip
+    result = evaluate({
+        'ndvi': ndvi_fc.select(['store_id', 'NDVI'], None, False),
+        'growth': growth_fc.select(['store_id', 'class'], None, False),
+    })
+
+    def by_store(fc, prop):
+        return {f['properties']['store_id']: f['properties'].get(prop)
+                for f in fc.get('features', [])}
+
+    ndvi_by_id = by_store(result['ndvi'], 'NDVI')
+    growth_by_id = by_store(result['growth'], 'class')
+
+    out = []
+    for store_id, lat, lng in stores:
+        hotspot_sq_meters = growth_by_id.get(store_id)
+        hotspot_ha = hotspot_sq_meters / 10000 if hotspot_sq_meters else 0
+        out.append({
+            "store_id": store_id,
+            "seasonal": seasonal_signal(ndvi_by_id.get(store_id), None, []),
+            "growth": growth_signal(hotspot_ha, None),
+        })
+    return out
+
+@track_round_trips("batch")
+def analyze_batch_gee(stores):
+    """
+    Seasonal NDVI and new-construction area for many stores.
+    stores is a list of (store_id, lat, lng). Each chunk of BATCH_CHUNK_SIZE stores is
+    one reduceRegions evaluation. Tile URLs and sample points are not produced in batch mode.
+    """
+    init_ee()
+    results = []
+    for i in range(0, len(stores), BATCH_CHUNK_SIZE):
+        results.extend(_analyze_batch_chunk(stores[i:i + BATCH_CHUNK_SIZE]))
+    return results
+
+def _months_ago(today: datetime.date, months: int):
+    month_index = today.year * 12 + today.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return datetime.date(year, month + 1, min(today.day, 28))
+
+def _ndvi_scenes(buffer, start: str, end: str):
+    history_collection = _s2_collection(buffer, start, end)
+
     def extract_history(img):
         ndvi_img = img.normalizedDifference(['B8', 'B4']).rename('NDVI')
         stats = ndvi_img.reduceRegion(
@@ -204,32 +534,186 @@ def analyze_history(store_id: str, lat: float, lng: float):
             maxPixels=1e9
         )
         return ee.Feature(None, {
+            'scene': img.get('system:index'),
             'date': img.date().format('YYYY-MM-dd'),
             'ndvi': stats.get('NDVI')
         })
         
-    hist_fc = ee.FeatureCollection(history_collection.map(extract_history)).getInfo()
-    
-    raw_history = []
-    for f in hist_fc.get('features', []):
-        props = f.get('properties', {})
-        if props.get('ndvi') is not None:
-             raw_history.append({
-                 "date": props['date'], 
-                 "ndvi": round(props['ndvi'], 3)
-             })
-             
-    raw_history.sort(key=lambda x: x['date'])
-    return raw_history
-
-def start_async_extraction_job(store_id: str, lat: float, lng: float):
-    """
-    Kicks off a production async extraction job exporting to BigQuery.
+    return ee.FeatureCollection(history_collection.map(extract_history))
+
+def _history_window(months: int):
+    today = datetime.date.today()
+    return _months_ago(today, months).isoformat(), (today + datetime.timedelta(days=1)).isoformat()
+
+def _history_ranges(key: str, start: str, end: str):
+    """
+    Date ranges within [start, end) that still have to be pulled from EE for a history key.
+    """
+    sync = get_history_sync(key)
+    if sync is None:
+        return [(start, end)]
+    ranges = []
+    if start < sync.start_date:
+        ranges.append((start, sync.start_date))
+    if time.time() - sync.synced_at > HISTORY_REFRESH_SECONDS:
+        resume = datetime.date.fromisoformat(sync.end_date) - datetime.timedelta(days=HISTORY_LOOKBACK_DAYS)
+        ranges.append((resume.isoformat(), end))
+    return ranges
+
+@coalesce("history", lambda store_id, lat, lng, months=HISTORY_MONTHS: (round(lat, 4), round(lng, 4), months))
+@track_round_trips("history")
+def analyze_history(store_id: str, lat: float, lng: float, months: int = HISTORY_MONTHS):
+    """
+    NDVI time series for the store buffer over the last `months` months.
+    Scene values are kept in the local store; only date ranges not yet synced
+    (plus a short lookback for late-arriving scenes) are pulled from EE.
+    """
+    key = history_key(lat, lng, BUFFER_METERS)
+    start, end = _history_window(months)
+    ranges = _history_ranges(key, start, end)
+
+    if ranges:
+        init_ee()
+        buffer = ee.Geometry.Point([lng, lat]).buffer(BUFFER_METERS)
+        # All missing ranges come back in one evaluation
+        result = evaluate({f"r{i}": _ndvi_scenes(buffer, s, e) for i, (s, e) in enumerate(ranges)})
+        rows = []
+        for fc in result.values():
+            for f in fc.get('features', []):
+                props = f.get('properties', {})
+                if props.get('ndvi') is not None:
+                    rows.append((props['scene'], props['date'], round(props['ndvi'], 3)))
+        put_ndvi_observations(key, rows, min(s for s, _ in ranges), end)
+
+    return query_ndvi(key, start)
+
+# --- Trade-area rings ---
+# Several radii around a store are reduced as disjoint annuli (0-1, 1-3, 3-5 miles) over one
+# shared composite of the outermost disc, all in a single evaluation. Every pixel is counted
+# once, so the cost matches a single-radius analysis; the value within each radius is then
+# accumulated outward from the annuli (count-weighted means, summed hectares).
+RING_RADII_MILES = (1, 3, 5)
+MAX_RINGS = 5
+MAX_RING_MILES = 10
+METERS_PER_MILE = 1609.344
+
+def ring_radii(miles):
+    """
+    Ascending ring radii in meters for radii in miles; raises ValueError if out of range.
+    """
+    miles = sorted(set(miles))
+    if not miles or len(miles) > MAX_RINGS or miles[0] <= 0 or miles[-1] > MAX_RING_MILES:
+        raise ValueError(f"Ring radii must be 1-{MAX_RINGS} values between 0 and {MAX_RING_MILES} miles")
+    # Truncated, so 5 miles is the BUFFER_METERS used elsewhere and shares its stored results
+    return [int(m * METERS_PER_MILE) for m in miles]
+
+def _rings(lat: float, lng: float, radii):
+    """
+    (FeatureCollection of annuli tagged with their ring index, outermost disc).
+    """
+    poi = ee.Geometry.Point([lng, lat])
+    discs = [poi.buffer(r) for r in radii]
+    rings = ee.FeatureCollection([
+        ee.Feature(disc if i == 0 else disc.difference(discs[i - 1], 1), {'ring': i})
+        for i, disc in enumerate(discs)
+    ])
+    return rings, discs[-1]
+
+def _mean_count():
+    return ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True)
+
+def _ring_scenes(rings, region, start: str, end: str):
+    def extract_rings(img):
+        ndvi_img = img.normalizedDifference(['B8', 'B4']).rename('NDVI')
+        return ndvi_img.reduceRegions(collection=rings, reducer=_mean_count(), scale=500).map(
+            lambda f: f.set({'scene': img.get('system:index'), 'date': img.date().format('YYYY-MM-dd')}))
+
+    return _s2_collection(region, start, end).map(extract_rings).flatten()
+
+def _accumulate(parts):
+    """
+    Mean within each radius from per-annulus (mean, pixel count) pairs, innermost first.
+    """
+    out, total, n = [], 0.0, 0
+    for mean, count in parts:
+        if mean is not None and count:
+            total += mean * count
+            n += count
+        out.append(total / n if n else None)
+    return out
+
+@coalesce("rings", lambda lat, lng, radii, months=HISTORY_MONTHS: (round(lat, 4), round(lng, 4), tuple(radii), months))
+@track_round_trips("rings")
+def analyze_rings_gee(lat: float, lng: float, radii, months: int = HISTORY_MONTHS):
+    """
+    NDVI, new-construction hectares and NDVI history within each radius (meters, ascending)
+    around a store, in one evaluation. Growth and history already in the store for every
+    radius are not reduced again.
     """
     init_ee()
-    # (Placeholder) Real implementation would use ee.batch.Export.table.toBigQuery()
-    # Which would output rows to GCP that the frontend ultimately queries.
-    return {
-        "status": "Job submitted to Earth Engine batch pool",
-        "task_id": "ee-task-12345"
-    }
+    rings, region = _rings(lat, lng, radii)
+    start_date, end_date = _recent_window()
+    exprs = {'ndvi': _recent_ndvi(region, start_date, end_date)
+             .reduceRegions(collection=rings, reducer=_mean_count(), scale=500)
+             .select(['ring', 'mean', 'count'], None, False)}
+
+    growth_keys = [growth_key(lat, lng, r, GROWTH_SCALE, GROWTH_WINDOWS) for r in radii]
+    hotspot_ha = [get_growth_result(k) for k in growth_keys]
+    if None in hotspot_ha:
+        area = _new_construction(region).multiply(ee.Image.pixelArea())
+        exprs['growth'] = (area.reduceRegions(collection=rings, reducer=ee.Reducer.sum().setOutputs(['class']),
+                                              scale=GROWTH_SCALE)
+                           .select(['ring', 'class'], None, False))
+
+    history_keys = [history_key(lat, lng, r) for r in radii]
+    start, end = _history_window(months)
+    ranges = [rng for key in history_keys for rng in _history_ranges(key, start, end)]
+    if ranges:
+        # One span covering what any ring is missing; rings already synced just get upserted again
+        fetch_start = min(s for s, _ in ranges)
+        exprs['history'] = (_ring_scenes(rings, region, fetch_start, end)
+                            .select(['ring', 'scene', 'date', 'mean', 'count'], None, False))
+
+    result = evaluate(exprs)
+
+    def by_ring(fc, *props):
+        rows = {f['properties'].get('ring'): f['properties'] for f in (fc or {}).get('features', [])}
+        return [tuple(rows.get(i, {}).get(p) for p in props) for i in range(len(radii))]
+
+    ndvi_parts = by_ring(result.get('ndvi'), 'mean', 'count')
+    ndvi_within = _accumulate(ndvi_parts)
+
+    if 'growth' in exprs:
+        ring_sq_meters = [row[0] or 0 for row in by_ring(result.get('growth'), 'class')]
+        hotspot_ha = [sq / 10000 for sq in itertools.accumulate(ring_sq_meters)]
+        for key, r, ha in zip(growth_keys, radii, hotspot_ha):
+            put_growth_result(key, lat, lng, r, GROWTH_SCALE, GROWTH_WINDOWS, ha)
+
+    if 'history' in exprs:
+        scenes = {}
+        for f in (result.get('history') or {}).get('features', []):
+            props = f.get('properties', {})
+            scenes.setdefault((props.get('scene'), props.get('date')), {})[props.get('ring')] = (props.get('mean'), props.get('count'))
+        rows = [[] for _ in radii]
+        for (scene, date), parts in scenes.items():
+            for i, ndvi in enumerate(_accumulate([parts.get(i, (None, 0)) for i in range(len(radii))])):
+                if ndvi is not None:
+                    rows[i].append((scene, date, round(ndvi, 3)))
+        for key, ring_rows in zip(history_keys, rows):
+            put_ndvi_observations(key, ring_rows, fetch_start, end)
+
+    out = []
+    for i, r in enumerate(radii):
+        disc_ha = math.pi * r ** 2 / 10000
+        out.append({
+            "radius_m": r,
+            "radius_miles": round(r / METERS_PER_MILE, 2),
+            "ndvi": ndvi_within[i],
+            "ring_ndvi": ndvi_parts[i][0],
+            "hotspot_ha": round(hotspot_ha[i], 1),
+            "ring_hotspot_ha": round(hotspot_ha[i] - (hotspot_ha[i - 1] if i else 0), 1),
+            "built_up_change_pct": round(100 * hotspot_ha[i] / disc_ha, 2),
+            "seasonal": seasonal_signal(ndvi_within[i], None, []),
+            "history": query_ndvi(history_keys[i], start),
+        })
+    return {"rings": out, "resolution_m": GROWTH_SCALE}
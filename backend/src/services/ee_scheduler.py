@@ -0,0 +1,198 @@
+import contextvars
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from . import deadline
+from .telemetry import observe
+
+logger = logging.getLogger(__name__)
+
+# Every EE call waits here for one of EE_MAX_CONCURRENT slots. Interactive requests always
+# go first; batch work (jobs, portfolio refreshes) only takes a slot when no interactive
+# call is waiting and leaves EE_INTERACTIVE_RESERVE slots free for dashboard traffic.
+# Quota errors (HTTP 429 / "Too many concurrent requests") are retried with full-jitter
+# exponential backoff, without holding a slot while sleeping. A request deadline bounds both
+# the time spent queued and the retries. Fan-out tasks that call EE run on per-lane pools sized
+# to the lane's slots, so queued EE work never holds threads other upstreams (or the other
+# lane) need.
+EE_MAX_CONCURRENT = int(os.environ.get("EE_MAX_CONCURRENT", "20"))
+EE_INTERACTIVE_RESERVE = int(os.environ.get("EE_INTERACTIVE_RESERVE", "4"))
+EE_BACKOFF_BASE = float(os.environ.get("EE_BACKOFF_BASE", "0.5"))
+EE_BACKOFF_CAP = float(os.environ.get("EE_BACKOFF_CAP", "30"))
+# Interactive callers give up sooner so a request fails fast instead of hanging
+EE_MAX_RETRIES = {"interactive": 3, "batch": 8}
+LANES = ("interactive", "batch")
+
+_QUOTA_MARKERS = ("429", "too many requests", "too many concurrent", "quota", "rate limit", "resource_exhausted")
+
+_lane = contextvars.ContextVar("ee_lane", default="interactive")
+
+class EEQuotaExceeded(Exception):
+    """
+    Earth Engine kept rejecting a call for quota after all retries.
+    """
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_quota_error(e: Exception):
+    text = str(e).lower()
+    return any(marker in text for marker in _QUOTA_MARKERS)
+
+@contextmanager
+def lane(name: str):
+    """
+    Runs EE calls made inside the block (including fan-out threads) in the given lane.
+    """
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+def current_lane():
+    return _lane.get()
+
+def batch(fn):
+    """
+    Decorator for background work: its EE calls use the batch lane.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with lane("batch"):
+            return fn(*args, **kwargs)
+    return wrapper
+
+class Scheduler:
+    def __init__(self, max_concurrent: int, interactive_reserve: int):
+        self.max_concurrent = max_concurrent
+        self.batch_limit = max(1, max_concurrent - interactive_reserve)
+        self._cond = threading.Condition()
+        self._active = {name: 0 for name in LANES}
+        self._waiting = {name: 0 for name in LANES}
+        self._pools = {
+            "interactive": ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="ee-interactive"),
+            "batch": ThreadPoolExecutor(max_workers=self.batch_limit, thread_name_prefix="ee-batch"),
+        }
+        self._stats = {name: {"calls": 0, "attempts": 0, "retries": 0, "quota_errors": 0, "failures": 0,
+                              "wait_seconds": 0.0, "max_wait_seconds": 0.0} for name in LANES}
+
+    def executor(self, name: str):
+        return self._pools[name]
+
+    def _can_start(self, name: str):
+        if sum(self._active.values()) >= self.max_concurrent:
+            return False
+        if name == "interactive":
+            return True
+        return self._waiting["interactive"] == 0 and self._active["batch"] < self.batch_limit
+
+    def _acquire(self, name: str):
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting[name] += 1
+            try:
+                while not self._can_start(name):
+                    left = deadline.remaining()
+                    if left == 0.0:
+                        raise deadline.DeadlineExceeded("Earth Engine call queued past the request deadline")
+                    self._cond.wait(left)
+                self._active[name] += 1
+            except deadline.DeadlineExceeded:
+                # A waiting interactive call holds back the batch lane, so wake waiters to re-check
+                self._cond.notify_all()
+                raise
+            finally:
+                self._waiting[name] -= 1
+                # Every attempt's wait counts, including retries and ones that gave up
+                waited = time.perf_counter() - start
+                s = self._stats[name]
+                s["attempts"] += 1
+                s["wait_seconds"] += waited
+                s["max_wait_seconds"] = max(s["max_wait_seconds"], waited)
+        observe("ee_queue_wait", (("lane", name),), waited)
+
+    def _release(self, name: str):
+        with self._cond:
+            self._active[name] -= 1
+            self._cond.notify_all()
+
+    def run(self, fn, *args, **kwargs):
+        name = _lane.get()
+        with self._cond:
+            self._stats[name]["calls"] += 1
+        attempt = 0
+        while True:
+            self._acquire(name)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_quota_error(e):
+                    with self._cond:
+                        self._stats[name]["failures"] += 1
+                    raise
+                error = e
+            finally:
+                self._release(name)
+
+            ceiling = min(EE_BACKOFF_CAP, EE_BACKOFF_BASE * 2 ** attempt)
+            delay = random.uniform(0, ceiling)
+            with self._cond:
+                s = self._stats[name]
+                s["quota_errors"] += 1
+                left = deadline.remaining()
+                if attempt >= EE_MAX_RETRIES[name] or (left is not None and delay >= left):
+                    s["failures"] += 1
+                    raise EEQuotaExceeded(f"Earth Engine quota exceeded: {error}", retry_after=ceiling)
+                s["retries"] += 1
+            logger.warning(f"EE quota error ({name}, attempt {attempt + 1}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "batch_limit": self.batch_limit,
+                "lanes": {
+                    name: {
+                        **s,
+                        "wait_seconds": round(s["wait_seconds"], 4),
+                        "max_wait_seconds": round(s["max_wait_seconds"], 4),
+                        "queued": self._waiting[name],
+                        "active": self._active[name],
+                        "mean_wait_seconds": round(s["wait_seconds"] / s["attempts"], 4) if s["attempts"] else 0.0,
+                    }
+                    for name, s in self._stats.items()
+                },
+            }
+
+_scheduler = Scheduler(EE_MAX_CONCURRENT, EE_INTERACTIVE_RESERVE)
+
+def _reset_after_fork():
+    # Slots held by the parent's threads would never be released in the child
+    global _scheduler
+    _scheduler = Scheduler(EE_MAX_CONCURRENT, EE_INTERACTIVE_RESERVE)
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def run(fn, *args, **kwargs):
+    """
+    Runs one blocking EE call under the scheduler in the current lane.
+    """
+    return _scheduler.run(fn, *args, **kwargs)
+
+def executor():
+    """
+    The thread pool for tasks that make EE calls in the current lane.
+    """
+    return _scheduler.executor(_lane.get())
+
+def stats():
+    return _scheduler.stats()
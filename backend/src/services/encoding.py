@@ -0,0 +1,150 @@
+import datetime
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON serialization
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: application/msgpack responses
+    msgpack = None
+
+# Content-negotiated response encodings for analysis payloads.
+#   application/json                          the regular shape
+#   application/vnd.greengrow.compact+json    compact shape (below), as JSON
+#   application/msgpack                       compact shape as MessagePack
+# The compact shape rewrites the bulky parts of a payload wherever they appear:
+#   geo_points          -> {"encoding": "polyline5", "points": "<encoded polyline>"}  (when non-empty)
+#   [{date, ndvi}, ...] -> {"encoding": "delta-days", "start": "YYYY-MM-DD", "days": [...], "ndvi": [...]}
+#   [{...}, ...]        -> {"encoding": "table", "columns": [...], "rows": [[...], ...]}
+# Table rows are flattened first (nested keys become "seasonal.metric") and must all end
+# up with the same columns.
+JSON = "application/json"
+COMPACT_JSON = "application/vnd.greengrow.compact+json"
+MSGPACK = "application/msgpack"
+POLYLINE_PRECISION = 5
+
+def encode_polyline(points, precision: int = POLYLINE_PRECISION):
+    """
+    Google encoded-polyline string for a list of {"lat", "lng"} points.
+    """
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for p in points:
+        lat, lng = round(p["lat"] * factor), round(p["lng"] * factor)
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = lat, lng
+    return "".join(out)
+
+def encode_series(history):
+    """
+    Columnar NDVI history with each date stored as days since the previous one.
+    """
+    days, prev = [], None
+    for row in history:
+        ordinal = datetime.date.fromisoformat(row["date"][:10]).toordinal()
+        days.append(0 if prev is None else ordinal - prev)
+        prev = ordinal
+    return {
+        "encoding": "delta-days",
+        "start": history[0]["date"][:10],
+        "days": days,
+        "ndvi": [row["ndvi"] for row in history],
+    }
+
+def _is_series(value):
+    return all(isinstance(row, dict) and row.keys() == {"date", "ndvi"} for row in value)
+
+def _flatten(row: dict, prefix: str = "", out: dict = None):
+    out = {} if out is None else out
+    for k, v in row.items():
+        if isinstance(v, dict) and v:
+            _flatten(v, f"{prefix}{k}.", out)
+        else:
+            out[prefix + k] = v
+    return out
+
+def _table(value):
+    if len(value) < 2 or not all(isinstance(row, dict) for row in value):
+        return None
+    rows = [_flatten(row) for row in value]
+    columns = rows[0].keys()
+    if any(row.keys() != columns for row in rows):
+        return None
+    columns = list(columns)
+    keys = [c.rsplit(".", 1)[-1] for c in columns]
+    # Most cells are scalars; only containers need another compact() pass
+    return {"encoding": "table", "columns": columns,
+            "rows": [[compact(row[c], k) if isinstance(row[c], (list, dict)) else row[c]
+                      for c, k in zip(columns, keys)] for row in rows]}
+
+def compact(value, key: str = None):
+    if key == "geo_points" and isinstance(value, list) and value:
+        return {"encoding": f"polyline{POLYLINE_PRECISION}", "points": encode_polyline(value)}
+    if isinstance(value, dict):
+        return {k: compact(v, k) for k, v in value.items()}
+    if isinstance(value, list) and value:
+        if _is_series(value):
+            return encode_series(value)
+        table = _table(value)
+        if table is not None:
+            return table
+        return [compact(v) for v in value]
+    return value
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str)
+    return json.dumps(payload, separators=(",", ":"), default=str).encode()
+
+def qvalues(header: str):
+    """
+    {token: q} for an Accept or Accept-Encoding header. A malformed q counts as 0 (not acceptable).
+    """
+    out = {}
+    for part in (header or "").lower().split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        out[token] = max(q, out.get(token, 0.0))
+    return out
+
+def negotiate(accept: str):
+    """
+    Media type to answer with for an Accept header; JSON unless a compact format is preferred.
+    """
+    q = qvalues(accept)
+    q.setdefault(MSGPACK, q.get("application/x-msgpack", 0.0))
+    # Without msgpack installed the compact shape still goes out, as JSON
+    offers = [(MSGPACK if msgpack is not None else COMPACT_JSON, q[MSGPACK]), (COMPACT_JSON, q.get(COMPACT_JSON, 0.0))]
+    media_type, best = max(offers, key=lambda offer: offer[1])
+    if best <= 0 or best < q.get(JSON, 0.0):
+        return JSON
+    return media_type
+
+def respond(payload, accept: str = None):
+    media_type = negotiate(accept)
+    if media_type == MSGPACK:
+        body = msgpack.packb(compact(payload), default=str)
+    elif media_type == COMPACT_JSON:
+        body = dumps(compact(payload))
+    else:
+        body = dumps(payload)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
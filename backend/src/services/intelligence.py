@@ -1,22 +1,189 @@
-from .earth_engine import analyze_seasonal_gee, analyze_growth_gee, analyze_history, start_async_extraction_job
-from .datacommons import get_location_metrics
-from .weather import get_weather_forecast
-from google import genai
-from google.genai import types
+from .earth_engine import (
+    init_ee,
+    analyze_seasonal_gee, analyze_growth_gee, analyze_batch_gee, analyze_history, round_trip_stats,
+    seasonal_ndvi_gee, seasonal_layers_gee, seasonal_signal, layer_id, LAYERS, TILE_URL_BASE,
+    analyze_rings_gee, ring_radii, RING_RADII_MILES,
+)
+from .datacommons import get_location_metrics, prefetch_location_metrics, get_client as get_datacommons_client, cache_stats as datacommons_cache_stats
+from .weather import get_weather_forecast, warm_pool, cache_stats as weather_cache_stats
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+import contextvars
+import json
+import logging
 import os
+import re
+import threading
+import time
 
-def generate_stocking_action(store_name, signal_type, metric, market_signal, location_context=None):
-    try:
-        client = genai.Client(vertexai=True, project=os.environ.get("GCP_PROJECT"), location="us-central1")
-        
-        context_str = ""
-        if location_context:
-            context_str = "Location Context:\n"
-            for k, v in location_context.items():
-                if k != 'dcid':
-                     context_str += f"- {k}: {v}\n"
-
-        prompt = f"""You are a retail inventory expert for "{store_name}".
+from .cache import TTLCache
+from .lazy import lazy_import
+from .singleflight import stats as singleflight_stats
+from .telemetry import span
+from . import deadline, ee_scheduler, raster_local, tiles
+from .store import init_store, put_portfolio, get_portfolio, put_signal_result, get_signal_results
+from . import jobs
+
+genai = lazy_import("google.genai")
+types = lazy_import("google.genai.types")
+
+logger = logging.getLogger(__name__)
+
+# Upstream calls are network-bound, so a shared thread pool lets them overlap.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("UPSTREAM_WORKERS", "16")),
+    thread_name_prefix="upstream",
+)
+# The Data Commons SDK takes no timeout, so a call fan_out gives up on keeps its thread until
+# it returns. Sources like that get their own bounded pools: abandoned calls can only hold
+# back later calls to the same source, never the shared pool.
+SOURCE_WORKERS = {
+    "metrics": int(os.environ.get("DATA_COMMONS_WORKERS", "8")),
+    "weather": int(os.environ.get("WEATHER_WORKERS", "8")),
+}
+_source_executors = {name: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"upstream-{name}")
+                     for name, n in SOURCE_WORKERS.items()}
+
+# Sources that call Earth Engine run on the scheduler's pools, sized to its slots
+EE_SOURCES = ("gee", "ndvi", "layers", "history", "growth")
+
+def _executor_for(source: str):
+    if source in EE_SOURCES:
+        return ee_scheduler.executor()
+    return _source_executors.get(source, _executor)
+
+# Per-source timeouts in seconds, measured from when the fan-out starts.
+TIMEOUTS = {
+    "gee": float(os.environ.get("GEE_TIMEOUT", "120")),
+    "metrics": float(os.environ.get("DATA_COMMONS_TIMEOUT", "10")),
+    "weather": float(os.environ.get("WEATHER_TIMEOUT", "6")),
+}
+
+_REQUIRED = object()
+# Default for a source that may run out of time but must not fail silently
+_PENDING = object()
+
+def fan_out(calls: dict, missing: list = None):
+    """
+    Runs independent upstream calls concurrently.
+    calls maps a source name to (fn, args, default). A source that exceeds its timeout or
+    the request deadline yields its default (and is appended to `missing` if given); if the
+    default is _REQUIRED the timeout is raised. Other errors also yield the default, except
+    for _REQUIRED and _PENDING sources, whose errors are raised. Timeouts are capped by the
+    request deadline.
+    """
+    start = time.monotonic()
+    # Each call runs in a copy of the caller's context so request-scoped spans and the deadline are kept
+    futures = {name: _executor_for(name).submit(contextvars.copy_context().run, fn, *args) for name, (fn, args, _) in calls.items()}
+    results = {}
+    for name, future in futures.items():
+        default = calls[name][2]
+        remaining = deadline.timeout(max(0.0, TIMEOUTS.get(name, 30) - (time.monotonic() - start)))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except (FutureTimeout, deadline.DeadlineExceeded):
+            future.cancel()
+            logger.warning(f"{name} timed out after {TIMEOUTS.get(name, 30)}s")
+            if default is _REQUIRED:
+                raise TimeoutError(f"{name} timed out")
+            results[name] = default
+            if missing is not None:
+                missing.append(name)
+        except Exception as e:
+            if default is _REQUIRED or default is _PENDING:
+                raise
+            logger.error(f"{name} failed: {e}")
+            results[name] = default
+            if missing is not None:
+                missing.append(name)
+    return results
+
+def get_location_context(lat: float, lng: float):
+    ctx = fan_out({
+        "metrics": (get_location_metrics, (lat, lng), {}),
+        "weather": (get_weather_forecast, (lat, lng), {}),
+    })
+    return {**ctx["metrics"], **ctx["weather"]}
+
+GEMINI_MODEL = "gemini-2.5-flash"
+FALLBACK_ACTION = "Check relevant inventory based on signal."
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", "30"))
+
+_genai_client = None
+_genai_lock = threading.Lock()
+
+# Actions for effectively identical inputs are reused for a few hours
+_action_cache = TTLCache("stocking_action", maxsize=5000, ttl=6 * 3600)
+
+def _reset_after_fork():
+    # Pool threads and the Gemini client's connections don't survive a fork; rebuild them lazily
+    global _executor, _source_executors, _genai_client, _genai_lock
+    _executor = ThreadPoolExecutor(max_workers=_executor._max_workers, thread_name_prefix="upstream")
+    _source_executors = {name: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"upstream-{name}")
+                         for name, n in SOURCE_WORKERS.items()}
+    _genai_client = None
+    _genai_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_genai_client():
+    global _genai_client
+    if _genai_client is None:
+        with _genai_lock:
+            if _genai_client is None:
+                _genai_client = genai.Client(vertexai=True, project=os.environ.get("GCP_PROJECT"), location="us-central1")
+    return _genai_client
+
+def _gemini_http_options():
+    # A real client-side timeout, capped by the request deadline, so a call that fan-out or a
+    # stream has given up on doesn't keep its pool thread
+    deadline.check("gemini")
+    return types.HttpOptions(timeout=max(1, int(deadline.timeout(GEMINI_TIMEOUT) * 1000)))
+
+def _bucket(value: float, step: float):
+    return round(value / step) * step
+
+def _bucket_text(text: str):
+    # Bucket the numbers we put into prompts so small float changes share a cache entry
+    text = re.sub(r"NDVI (-?\d+(?:\.\d+)?)", lambda m: f"NDVI {_bucket(float(m.group(1)), 0.05):.2f}", text)
+    text = re.sub(r"(\d+(?:\.\d+)?) Ha", lambda m: f"{_bucket(float(m.group(1)), 50):.0f} Ha", text)
+    text = re.sub(r"(-?\d+(?:\.\d+)?)°F", lambda m: f"{_bucket(float(m.group(1)), 5):.0f}°F", text)
+    text = re.sub(r"(\d+(?:\.\d+)?)%", lambda m: f"{_bucket(float(m.group(1)), 10):.0f}%", text)
+    return text
+
+def _bucket_value(v):
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        # 2 significant figures is plenty for population/income/rates
+        return float(f"{v:.2g}")
+    if isinstance(v, str):
+        return _bucket_text(v)
+    return str(v)
+
+def stocking_cache_key(store_name, signal_type, metric, market_signal, location_context=None):
+    ctx = tuple(sorted(
+        (k, _bucket_value(v)) for k, v in (location_context or {}).items() if k != 'dcid'
+    ))
+    return (
+        (store_name or "").strip().lower(),
+        (signal_type or "").strip().lower(),
+        _bucket_text(metric or ""),
+        (market_signal or "").strip(),
+        ctx,
+    )
+
+def cache_stats():
+    return [_action_cache.stats()]
+
+def _build_prompt(store_name, signal_type, metric, market_signal, location_context=None):
+    context_str = ""
+    if location_context:
+        context_str = "Location Context:\n"
+        for k, v in location_context.items():
+            if k != 'dcid':
+                 context_str += f"- {k}: {v}\n"
+
+    return f"""You are a retail inventory expert for "{store_name}".
 Current Intelligence:
 - Signal Type: {signal_type}
 - Metric: {metric}
@@ -26,47 +193,470 @@ Based on this intelligence and the location/weather context, suggest a concise (
 Focus on specific product categories relevant to the signal AND the current/upcoming weather if applicable.
 Output ONLY the stocking action text."""
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
+def generate_stocking_action(store_name, signal_type, metric, market_signal, location_context=None):
+    key = stocking_cache_key(store_name, signal_type, metric, market_signal, location_context)
+    cached = _action_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        client = get_genai_client()
+        prompt = _build_prompt(store_name, signal_type, metric, market_signal, location_context)
+
+        with span("gemini"):
+            response = client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="text/plain",
+                    top_p=0.5,
+                    http_options=_gemini_http_options(),
+                )
+            )
+        action = response.text.strip()
+        _action_cache.set(key, action)
+        return action
+    except Exception as e:
+        print(f"Gemini Error: {e}")
+        return FALLBACK_ACTION
+
+STOCKING_BATCH_SIZE = int(os.environ.get("STOCKING_BATCH_SIZE", "25"))
+STOCKING_BATCH_RETRIES = 2
+
+_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "INTEGER"},
+            "stocking_action": {"type": "STRING"},
+        },
+        "required": ["id", "stocking_action"],
+    },
+}
+
+def _build_batch_prompt(items):
+    blocks = []
+    for i, req in items:
+        context_lines = "".join(
+            f"  - {k}: {v}\n" for k, v in (req.get("location_context") or {}).items() if k != 'dcid'
+        )
+        blocks.append(f"""Item {i}:
+- Store: "{req.get('store_name')}"
+- Signal Type: {req.get('signal_type')}
+- Metric: {req.get('metric')}
+- Insight: {req.get('market_signal')}
+{"- Location Context:" + chr(10) + context_lines if context_lines else ""}""")
+    items_str = "\n".join(blocks)
+    return f"""You are a retail inventory expert. For EACH item below, suggest a concise (max 10 words) and high-impact stocking action for that store's manager.
+Focus on specific product categories relevant to the signal AND the current/upcoming weather if applicable.
+
+{items_str}
+Return a JSON array with one object per item: {{"id": <item number>, "stocking_action": <text>}}."""
+
+def _generate_batch(items):
+    """
+    One Gemini call for a list of (id, request dict). Returns {id: action} for the ids answered.
+    """
+    with span("gemini_batch"):
+        response = get_genai_client().models.generate_content(
+            model=GEMINI_MODEL,
+            contents=_build_batch_prompt(items),
             config=types.GenerateContentConfig(
-                response_mime_type="text/plain",
+                response_mime_type="application/json",
+                response_schema=_BATCH_SCHEMA,
                 top_p=0.5,
+                http_options=_gemini_http_options(),
             )
         )
-        return response.text.strip()
+    wanted = {i for i, _ in items}
+    answers = {}
+    for entry in json.loads(response.text):
+        action = (entry.get("stocking_action") or "").strip()
+        if entry.get("id") in wanted and action:
+            answers[entry["id"]] = action
+    return answers
+
+def _generate_with_retries(items, attempt: int = 0):
+    try:
+        answers = _generate_batch(items)
     except Exception as e:
-        print(f"Gemini Error: {e}")
-        return "Check relevant inventory based on signal."
-
-def analyze_seasonal(store_id: str, lat: float, lng: float, store_name: str = "Store"):
-    # 1. Get GEE Signal
-    gee_data = analyze_seasonal_gee(lat, lng)
-    
-    # 2. Get Location Context
-    metrics = get_location_metrics(lat, lng)
-    weather = get_weather_forecast(lat, lng)
-    
-    # 3. Combine
-    gee_data["location_context"] = {**metrics, **weather}
-    return gee_data
+        print(f"Gemini Batch Error ({len(items)} items): {e}")
+        answers = {}
+
+    missing = [(i, req) for i, req in items if i not in answers]
+    if missing and attempt < STOCKING_BATCH_RETRIES:
+        # Retry what's missing, halving the batch each time
+        half = max(1, len(missing) // 2)
+        for j in range(0, len(missing), half):
+            answers.update(_generate_with_retries(missing[j:j + half], attempt + 1))
+    return answers
+
+def generate_stocking_actions(requests_):
+    """
+    Stocking actions for many requests (dicts with StockingRequest fields), in order.
+    Cached and duplicate requests are answered without an LLM call; the rest are packed
+    into prompts of up to STOCKING_BATCH_SIZE items with a JSON-schema response.
+    """
+    keys = [stocking_cache_key(r.get("store_name"), r.get("signal_type"), r.get("metric"),
+                               r.get("market_signal"), r.get("location_context")) for r in requests_]
+    results = {}
+    pending = {}
+    for key, req in zip(keys, requests_):
+        cached = _action_cache.get(key)
+        if cached is not None:
+            results[key] = cached
+        elif key not in pending:
+            pending[key] = req
+
+    pending_keys = list(pending)
+    items = list(enumerate(pending.values()))
+    chunks = [items[i:i + STOCKING_BATCH_SIZE] for i in range(0, len(items), STOCKING_BATCH_SIZE)]
+    futures = [_executor.submit(contextvars.copy_context().run, _generate_with_retries, chunk) for chunk in chunks]
+    for answers in (f.result() for f in futures):
+        for i, action in answers.items():
+            results[pending_keys[i]] = action
+            _action_cache.set(pending_keys[i], action)
 
-def analyze_growth(store_id: str, lat: float, lng: float, store_name: str = "Store"):
-    # 1. Get GEE Signal
-    gee_data = analyze_growth_gee(lat, lng)
-    
-    # 2. Get Location Context
-    metrics = get_location_metrics(lat, lng)
-    weather = get_weather_forecast(lat, lng)
-    
-    # 3. Combine
-    gee_data["location_context"] = {**metrics, **weather}
+    return [results.get(key, FALLBACK_ACTION) for key in keys]
+
+# Where NDVI/built-up analyses run: "ee" (Earth Engine), "local" (NumPy over synced
+# raster chips) or "auto" (local when the store has a recently synced chip, otherwise EE).
+COMPUTE_BACKEND = os.environ.get("COMPUTE_BACKEND", "ee")
+
+def _use_local(lat: float, lng: float):
+    if COMPUTE_BACKEND == "local":
+        return True
+    if COMPUTE_BACKEND != "auto":
+        return False
+    if raster_local.has_chip(lat, lng):
+        return True
+    if raster_local.chip_age(lat, lng) is not None:
+        # Stale chip: answer from EE this time and bring the chip up to date
+        _resync_in_background(lat, lng)
+    return False
+
+def seasonal_signal_for(lat: float, lng: float):
+    if _use_local(lat, lng):
+        return raster_local.analyze_seasonal_local(lat, lng)
+    return analyze_seasonal_gee(lat, lng)
+
+def growth_signal_for(lat: float, lng: float):
+    if _use_local(lat, lng):
+        return raster_local.analyze_growth_local(lat, lng)
+    return analyze_growth_gee(lat, lng)
+
+def _analyze_with_context(gee_fn, lat: float, lng: float, missing: list = None):
+    # GEE signal and location context are independent, so fetch them concurrently
+    results = fan_out({
+        "gee": (gee_fn, (lat, lng), _REQUIRED),
+        "metrics": (get_location_metrics, (lat, lng), {}),
+        "weather": (get_weather_forecast, (lat, lng), {}),
+    }, missing)
+    gee_data = results["gee"]
+    gee_data["location_context"] = {**results["metrics"], **results["weather"]}
     return gee_data
 
+# Dashboard analyses answer within a time budget. A store's last good result is served
+# at once (marked stale past SWR_FRESH_SECONDS, with a background refresh); otherwise the
+# parts that finish inside the budget are returned and marked partial.
+REQUEST_BUDGET_SECONDS = float(os.environ.get("REQUEST_BUDGET_SECONDS", "8"))
+SWR_FRESH_SECONDS = float(os.environ.get("SWR_FRESH_SECONDS", "900"))
+SIGNAL_FNS = {"seasonal": seasonal_signal_for, "growth": growth_signal_for}
+
+def _refresh_in_background(store_id: str, lat: float, lng: float, kind: str):
+    if not jobs.has_pending("precompute", "store_id", store_id):
+        jobs.submit("precompute", {"store_id": store_id, "lat": lat, "lng": lng, "signals": [kind]})
+
+def _analyze_within_budget(kind: str, store_id: str, lat: float, lng: float, budget: float = None):
+    last = get_signal_results(store_id).get(kind)
+    if last:
+        age = time.time() - last["computed_at"]
+        stale = age > SWR_FRESH_SECONDS
+        if stale:
+            _refresh_in_background(store_id, lat, lng, kind)
+        return {**last["data"], "partial": False, "stale": stale, "age_seconds": round(age, 1)}
+
+    missing = []
+    with deadline.within(REQUEST_BUDGET_SECONDS if budget is None else budget):
+        results = fan_out({
+            "gee": (SIGNAL_FNS[kind], (lat, lng), _PENDING),
+            "metrics": (get_location_metrics, (lat, lng), {}),
+            "weather": (get_weather_forecast, (lat, lng), {}),
+        }, missing)
+
+    context = {**results["metrics"], **results["weather"]}
+    if results["gee"] is _PENDING:
+        # The signal itself didn't make the budget; compute it in the background for next time
+        _refresh_in_background(store_id, lat, lng, kind)
+        return {"type": kind.title(), "metric": None, "market_signal": None, "stocking_action": None,
+                "intensity": None, "tile_url": None, "geo_points": [], "location_context": context,
+                "partial": True, "stale": False, "missing": missing}
+
+    data = {**results["gee"], "location_context": context}
+    if missing:
+        return {**data, "partial": True, "stale": False, "missing": missing}
+    put_signal_result(store_id, kind, data)
+    return {**data, "partial": False, "stale": False, "age_seconds": 0.0}
+
+def analyze_seasonal(store_id: str, lat: float, lng: float, store_name: str = "Store", budget: float = None):
+    return _analyze_within_budget("seasonal", store_id, lat, lng, budget)
+
+def analyze_growth(store_id: str, lat: float, lng: float, store_name: str = "Store", budget: float = None):
+    return _analyze_within_budget("growth", store_id, lat, lng, budget)
+
+def analyze_rings(store_id: str, lat: float, lng: float, radii_miles=None, months: int = 6):
+    """
+    Seasonal NDVI, new-construction area and NDVI history within each trade-area radius.
+    Raises ValueError for invalid radii.
+    """
+    return analyze_rings_gee(lat, lng, ring_radii(radii_miles or RING_RADII_MILES), months)
+
+def analyze_batch(stores):
+    """
+    stores is a list of (store_id, lat, lng). Returns per-store seasonal and growth signals.
+    """
+    return analyze_batch_gee(stores)
+
+STREAM_TIMEOUT = float(os.environ.get("STREAM_TIMEOUT", "300"))
+
+def stream_store_analysis(store_id: str, lat: float, lng: float, store_name: str = "Store"):
+    """
+    Yields (event, data) for a store as each part becomes ready:
+    weather, demographics, ndvi, seasonal (tile + sample points), history, growth,
+    stocking_action (one per signal), error (per failed part) and finally done.
+    All upstream calls start at once; stocking actions start as soon as a signal's
+    classification and the location context are known.
+    """
+    pending = {}
+    results = {}
+    actions_started = set()
+    stream_deadline = time.monotonic() + STREAM_TIMEOUT
+
+    def run_within(fn, *args):
+        # The generator is stepped from different contexts, so each part sets the deadline in its own
+        with deadline.within(max(0.0, stream_deadline - time.monotonic())):
+            return fn(*args)
+
+    def submit(name, fn, *args):
+        source = "metrics" if name == "demographics" else name
+        pending[_executor_for(source).submit(contextvars.copy_context().run, run_within, fn, *args)] = name
+
+    local = _use_local(lat, lng)
+    submit("weather", get_weather_forecast, lat, lng)
+    submit("demographics", get_location_metrics, lat, lng)
+    if local:
+        submit("seasonal_local", raster_local.analyze_seasonal_local, lat, lng)
+    else:
+        submit("ndvi", seasonal_ndvi_gee, lat, lng)
+        submit("layers", seasonal_layers_gee, lat, lng)
+    submit("history", get_history, store_id, lat, lng)
+    submit("growth", growth_signal_for, lat, lng)
+
+    def context():
+        return {**(results.get("demographics") or {}), **(results.get("weather") or {})}
+
+    def start_actions():
+        if "weather" not in results or "demographics" not in results:
+            return
+        for kind in ("seasonal_signal", "growth"):
+            signal = results.get(kind)
+            if signal and kind not in actions_started:
+                actions_started.add(kind)
+                submit(f"action:{signal['type']}", generate_stocking_action, store_name,
+                       signal["type"], signal["metric"], signal["market_signal"], context())
+
+    while pending:
+        done, _ = wait(list(pending), timeout=max(0.0, stream_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            for name in pending.values():
+                yield "error", {"part": name, "detail": "timed out"}
+            break
+        for future in done:
+            name = pending.pop(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                logger.error(f"Stream part {name} failed: {e}")
+                yield "error", {"part": name, "detail": str(e)}
+                results[name] = None
+                if name in ("weather", "demographics"):
+                    results[name] = {}
+                    start_actions()
+                continue
+
+            results[name] = value
+            if name in ("weather", "demographics", "history"):
+                yield name, value
+            elif name == "seasonal_local":
+                results["seasonal_signal"] = value
+                yield "ndvi", {**value, "tile_url": None, "geo_points": []}
+                yield "seasonal", value
+            elif name == "ndvi":
+                results["seasonal_signal"] = seasonal_signal(value, None, [])
+                yield "ndvi", results["seasonal_signal"]
+            elif name == "growth":
+                yield "growth", value
+            elif name.startswith("action:"):
+                yield "stocking_action", {"signal_type": name.split(":", 1)[1], "stocking_action": value}
+
+            # The full seasonal signal needs both the NDVI value and the layers
+            if name in ("ndvi", "layers") and results.get("ndvi") is not None and results.get("layers"):
+                tile_url, points = results["layers"]
+                yield "seasonal", seasonal_signal(results["ndvi"], tile_url, points)
+            start_actions()
+
+    yield "done", {"store_id": store_id}
+
 # Proxy function for history
-def get_history(store_id: str, lat: float, lng: float):
-    return analyze_history(store_id, lat, lng)
+def get_history(store_id: str, lat: float, lng: float, months: int = 6):
+    if _use_local(lat, lng):
+        return raster_local.analyze_history_local(store_id, lat, lng, months)
+    return analyze_history(store_id, lat, lng, months)
+
+# --- Background precomputation ---
+PRECOMPUTE_SIGNALS = ["seasonal", "growth", "history"]
+
+def _precompute_store(payload: dict):
+    store_id, lat, lng = payload["store_id"], payload["lat"], payload["lng"]
+    computed, partial = [], {}
+    for kind in payload.get("signals") or PRECOMPUTE_SIGNALS:
+        missing = []
+        if kind in SIGNAL_FNS:
+            data = _analyze_with_context(SIGNAL_FNS[kind], lat, lng, missing)
+        elif kind == "history":
+            data = get_history(store_id, lat, lng)
+        else:
+            raise ValueError(f"Unknown signal: {kind}")
+        if missing:
+            # Don't let a result without its location context become the last good one
+            partial[kind] = missing
+            continue
+        put_signal_result(store_id, kind, data)
+        computed.append(kind)
+        # Hot stores get their low-zoom map tiles rendered ahead of the first view
+        if tiles.TILE_PRERENDER_MAX_ZOOM and kind in LAYERS and (data.get("tile_url") or "").startswith(TILE_URL_BASE):
+            tiles.prerender(layer_id(kind, lat, lng))
+    return {"store_id": store_id, "computed": computed, "partial": partial}
+
+def _store_payload(store: dict):
+    return {"store_id": store["id"], "lat": store["lat"], "lng": store["lng"], "store_name": store.get("name", "Store")}
+
+def prefetch_context(stores=None):
+    """
+    Bulk-loads Data Commons metrics for the given stores (default: the portfolio) so their
+    location context is served from cache.
+    """
+    stores = get_portfolio() if stores is None else stores
+    return prefetch_location_metrics([(s["lat"], s["lng"]) for s in stores])
+
+def refresh_portfolio():
+    """
+    Enqueues a context prefetch, then a precompute job for every portfolio store that doesn't
+    already have one pending.
+    """
+    submitted = []
+    if not jobs.has_pending("prefetch_context", "scope", "portfolio"):
+        submitted.append(jobs.submit("prefetch_context", {"scope": "portfolio"})["id"])
+    pending = jobs.pending_values("precompute", "store_id")
+    payloads = [_store_payload(store) for store in get_portfolio() if store["id"] not in pending]
+    if payloads:
+        submitted.extend(job["id"] for job in jobs.submit_many("precompute", payloads))
+    return {"status": "queued", "jobs": submitted}
+
+def register_portfolio(stores):
+    put_portfolio(stores)
+    return {"registered": len(stores)}
+
+def get_precomputed(store_id: str):
+    return get_signal_results(store_id)
+
+def _sync_raster_chip(payload: dict):
+    return raster_local.sync_chip(payload["lat"], payload["lng"])
+
+def _chip_payload(store_id, lat: float, lng: float):
+    return {"store_id": store_id, "lat": lat, "lng": lng, "chip": os.path.basename(raster_local.chip_path(lat, lng))}
+
+def sync_raster_chip(store_id: str, lat: float, lng: float):
+    job = jobs.submit("sync_chip", _chip_payload(store_id, lat, lng))
+    return {"status": "queued", "task_id": job["id"]}
+
+def _resync_in_background(lat: float, lng: float):
+    payload = _chip_payload(None, lat, lng)
+    if not jobs.has_pending("sync_chip", "chip", payload["chip"]):
+        jobs.submit("sync_chip", payload)
+
+# Background jobs run their EE calls in the scheduler's batch lane, behind dashboard traffic
+jobs.register_handler("precompute", ee_scheduler.batch(_precompute_store))
+jobs.register_handler("sync_chip", ee_scheduler.batch(_sync_raster_chip))
+jobs.register_handler("prefetch_context", lambda payload: prefetch_context())
+jobs.register_schedule(refresh_portfolio)
+
+def trigger_extraction(store_id: str, lat: float, lng: float, store_name: str = "Store"):
+    job = jobs.submit("precompute", _store_payload({"id": store_id, "lat": lat, "lng": lng, "name": store_name}))
+    return {
+        "status": "Job queued for background extraction",
+        "task_id": job["id"]
+    }
+
+def metrics_gauges():
+    """
+    Cache, single-flight and EE round-trip counters as (name, labels, value) for /api/metrics.
+    """
+    gauges = []
+    for s in all_cache_stats():
+        labels = (("cache", s["name"]),)
+        for field in ("hits", "misses", "evictions", "size", "calls", "coalesced", "in_flight"):
+            if field in s:
+                gauges.append((f"cache_{field}", labels, s[field]))
+    for endpoint, s in round_trip_stats().items():
+        gauges.append(("ee_round_trips_total", (("endpoint", endpoint),), s["round_trips"]))
+        gauges.append(("ee_analyses_total", (("endpoint", endpoint),), s["calls"]))
+    for lane, s in ee_scheduler.stats()["lanes"].items():
+        labels = (("lane", lane),)
+        gauges.append(("ee_queue_depth", labels, s["queued"]))
+        gauges.append(("ee_active_calls", labels, s["active"]))
+        gauges.append(("ee_quota_errors_total", labels, s["quota_errors"]))
+        gauges.append(("ee_retries_total", labels, s["retries"]))
+    return gauges
+
+def all_cache_stats():
+    return (datacommons_cache_stats() + weather_cache_stats() + cache_stats() + tiles.cache_stats()
+            + singleflight_stats())
+
+# --- Startup warm-up ---
+_startup = {"warmup": {}, "warmup_seconds": None}
+
+def warm_up():
+    """
+    Initializes EE auth, the Gemini and Data Commons clients, the Open-Meteo pool and the
+    local store concurrently, so the first user request doesn't pay for them.
+    Meant to run in a background thread during app startup.
+    """
+    steps = {
+        "earth_engine": init_ee,
+        "gemini": get_genai_client,
+        "datacommons": get_datacommons_client,
+        "open_meteo": warm_pool,
+        "result_store": init_store,
+    }
+
+    def timed_step(fn):
+        start = time.perf_counter()
+        try:
+            fn()
+            return {"status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            return {"status": "error", "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+
+    start = time.perf_counter()
+    futures = {name: _executor.submit(timed_step, fn) for name, fn in steps.items()}
+    for name, future in futures.items():
+        _startup["warmup"][name] = future.result()
+        if _startup["warmup"][name]["status"] != "ok":
+            logger.warning(f"Warm-up of {name} failed: {_startup['warmup'][name]['error']}")
+    _startup["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Warm-up finished in {_startup['warmup_seconds']}s")
 
-# Proxy for async job
-def trigger_extraction(store_id: str, lat: float, lng: float):
-    return start_async_extraction_job(store_id, lat, lng)
+def startup_report():
+    return _startup
@@ -0,0 +1,295 @@
+from sqlmodel import Session, select, update
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; there every process runs the scheduler
+    fcntl = None
+
+from .store import DB_PATH, engine, init_store, Job
+
+logger = logging.getLogger(__name__)
+
+# Background job queue persisted in the local SQLite store, drained by a bounded pool
+# of worker threads. Handlers are registered per job kind by the services that own them.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# A failed job is retried after JOB_BACKOFF_SECONDS x 2^(attempt - 1), capped, or after the
+# error's retry_after (e.g. an EE quota error) if that is longer
+JOB_BACKOFF_SECONDS = float(os.environ.get("JOB_BACKOFF_SECONDS", "30"))
+JOB_BACKOFF_MAX_SECONDS = float(os.environ.get("JOB_BACKOFF_MAX_SECONDS", "3600"))
+JOB_POLL_SECONDS = 1.0
+# How often the scheduler enqueues portfolio precomputation, starting at startup (0 disables it)
+SCHEDULE_INTERVAL_SECONDS = int(os.environ.get("PRECOMPUTE_INTERVAL_SECONDS", str(6 * 3600)))
+# With several worker processes every one drains the queue (claims are atomic), but only the
+# holder of this file lock schedules precomputes and requeues jobs interrupted by a restart
+LEADER_LOCK_PATH = f"{DB_PATH}.leader.lock"
+# Each worker process holds a lock on its own file while it lives, and claimed jobs record
+# that worker's token, so the leader requeues only jobs whose worker has died
+WORKER_LOCK_DIR = f"{DB_PATH}.workers"
+
+_handlers = {}
+_schedules = []
+_threads = []
+_stop = threading.Event()
+_wakeup = threading.Event()
+_leader_file = None
+_worker_token = None
+_worker_file = None
+
+def _reset_after_fork():
+    # Worker threads are not copied into a forked process, so let start() create them again
+    global _threads, _stop, _wakeup, _leader_file, _worker_token, _worker_file
+    _threads = []
+    _stop = threading.Event()
+    _wakeup = threading.Event()
+    _leader_file = None
+    _worker_token = None
+    _worker_file = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def register_handler(kind: str, fn):
+    _handlers[kind] = fn
+
+def register_schedule(fn):
+    """
+    fn() is called every SCHEDULE_INTERVAL_SECONDS and should enqueue jobs.
+    """
+    _schedules.append(fn)
+
+def _job_dict(job: Job, with_result: bool = False):
+    d = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "not_before": job.not_before,
+        "payload": json.loads(job.payload),
+    }
+    if with_result:
+        d["result"] = json.loads(job.result) if job.result else None
+    return d
+
+def submit(kind: str, payload: dict):
+    return submit_many(kind, [payload])[0]
+
+def submit_many(kind: str, payloads):
+    """
+    Enqueues one job per payload in a single transaction.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    init_store()
+    now = time.time()
+    jobs = [Job(id=uuid.uuid4().hex, kind=kind, payload=json.dumps(p), status="queued", created_at=now) for p in payloads]
+    with Session(engine, expire_on_commit=False) as session:
+        session.add_all(jobs)
+        session.commit()
+    _wakeup.set()
+    return [_job_dict(job) for job in jobs]
+
+def get_job(job_id: str, with_result: bool = False):
+    init_store()
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        return _job_dict(job, with_result) if job else None
+
+def list_jobs(status: str = None, limit: int = 100):
+    init_store()
+    with Session(engine) as session:
+        stmt = select(Job)
+        if status:
+            stmt = stmt.where(Job.status == status)
+        jobs = session.exec(stmt.order_by(Job.created_at.desc()).limit(limit)).all()
+        return [_job_dict(j) for j in jobs]
+
+def pending_values(kind: str, key: str):
+    """
+    The set of payload[key] over queued and running jobs of this kind.
+    """
+    init_store()
+    with Session(engine) as session:
+        payloads = session.exec(select(Job.payload).where(Job.kind == kind, Job.status.in_(["queued", "running"]))).all()
+        return {json.loads(p).get(key) for p in payloads}
+
+def has_pending(kind: str, key: str, value):
+    """
+    True if a queued or running job of this kind has payload[key] == value.
+    """
+    return value in pending_values(kind, key)
+
+def _claim():
+    # Conditional update so only one worker can move a job from queued to running
+    with Session(engine) as session:
+        now = time.time()
+        candidates = session.exec(
+            select(Job.id)
+            .where(Job.status == "queued", Job.not_before.is_(None) | (Job.not_before <= now))
+            .order_by(Job.created_at).limit(5)
+        ).all()
+        for job_id in candidates:
+            res = session.exec(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(status="running", started_at=time.time(), attempts=Job.attempts + 1, claimed_by=_worker_token)
+            )
+            session.commit()
+            if res.rowcount == 1:
+                return session.get(Job, job_id)
+    return None
+
+def _finish(job_id: str, status: str, result=None, error: str = None, not_before: float = None):
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        job.status = status
+        job.result = json.dumps(result) if result is not None else None
+        job.error = error
+        job.finished_at = time.time()
+        job.not_before = not_before
+        session.add(job)
+        session.commit()
+
+def _run_one():
+    job = _claim()
+    if job is None:
+        return False
+    try:
+        result = _handlers[job.kind](json.loads(job.payload))
+        _finish(job.id, "done", result=result)
+    except Exception as e:
+        logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+        if job.attempts < JOB_MAX_ATTEMPTS:
+            delay = max(min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1)),
+                        getattr(e, "retry_after", 0) or 0)
+            _finish(job.id, "queued", error=str(e), not_before=time.time() + delay)
+        else:
+            _finish(job.id, "failed", error=str(e))
+    return True
+
+def _worker():
+    while not _stop.is_set():
+        try:
+            if _run_one():
+                continue
+        except Exception as e:
+            logger.error(f"Job worker error: {e}")
+        _wakeup.wait(JOB_POLL_SECONDS)
+        _wakeup.clear()
+
+def _run_schedules():
+    for fn in _schedules:
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Scheduled task failed: {e}")
+
+def _scheduler():
+    # The first run is right after taking leadership, so instances that restart more often
+    # than SCHEDULE_INTERVAL_SECONDS (e.g. Cloud Run) still refresh
+    _run_schedules()
+    while not _stop.wait(SCHEDULE_INTERVAL_SECONDS):
+        try:
+            _requeue_interrupted()
+        except Exception as e:
+            logger.error(f"Requeueing interrupted jobs failed: {e}")
+        _run_schedules()
+
+def _acquire_leadership():
+    """
+    True if this process holds the leader lock, which it keeps until it exits.
+    """
+    global _leader_file
+    if fcntl is None:
+        return True
+    if _leader_file is None:
+        f = open(LEADER_LOCK_PATH, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        _leader_file = f
+    return True
+
+def _register_worker():
+    global _worker_token, _worker_file
+    if _worker_token is None:
+        token = uuid.uuid4().hex
+        if fcntl is not None:
+            os.makedirs(WORKER_LOCK_DIR, exist_ok=True)
+            path = os.path.join(WORKER_LOCK_DIR, f"{token}.lock")
+            # Locked before it appears under its final name, so a sweep never mistakes it for a dead worker
+            f = open(f"{path}.tmp", "w")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            os.replace(f"{path}.tmp", path)
+            _worker_file = f
+        _worker_token = token
+
+def _worker_alive(token: str):
+    if token == _worker_token:
+        return True
+    if not token or fcntl is None:
+        return False
+    path = os.path.join(WORKER_LOCK_DIR, f"{token}.lock")
+    if not os.path.exists(path):
+        return False
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+    os.remove(path)
+    return False
+
+def _requeue_interrupted():
+    # Jobs whose worker died never finished; put them back in the queue. Jobs claimed by
+    # live workers, including ones that started before this process, are left alone.
+    if fcntl is not None and os.path.isdir(WORKER_LOCK_DIR):
+        for name in os.listdir(WORKER_LOCK_DIR):
+            if name.endswith(".lock"):
+                _worker_alive(name[:-len(".lock")])  # removes the files of exited workers
+    with Session(engine) as session:
+        running = session.exec(select(Job.id, Job.claimed_by).where(Job.status == "running")).all()
+        orphaned = [job_id for job_id, token in running if not _worker_alive(token)]
+        if orphaned:
+            session.exec(update(Job).where(Job.id.in_(orphaned), Job.status == "running").values(status="queued"))
+            session.commit()
+            logger.info(f"Requeued {len(orphaned)} interrupted jobs")
+
+def start():
+    if _threads:
+        return
+    init_store()
+    _register_worker()
+    leader = _acquire_leadership()
+    if leader:
+        _requeue_interrupted()
+    _stop.clear()
+    for i in range(JOB_WORKERS):
+        t = threading.Thread(target=_worker, name=f"job-worker-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+    if leader and SCHEDULE_INTERVAL_SECONDS > 0:
+        t = threading.Thread(target=_scheduler, name="job-scheduler", daemon=True)
+        t.start()
+        _threads.append(t)
+
+def is_leader():
+    return _leader_file is not None or (fcntl is None and bool(_threads))
+
+def stop():
+    _stop.set()
+    _wakeup.set()
+    for t in _threads:
+        t.join(timeout=5)
+    _threads.clear()
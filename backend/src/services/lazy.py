@@ -0,0 +1,21 @@
+import importlib
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access.
+    Keeps heavy SDKs (ee, google.genai, datacommons_client, numpy) off the cold-start path.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+def lazy_import(name: str):
+    return LazyModule(name)
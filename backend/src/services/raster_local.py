@@ -0,0 +1,283 @@
+import datetime
+import json
+import logging
+import math
+import os
+import time
+
+from .earth_engine import (
+    BUFFER_METERS, GROWTH_PAST, GROWTH_CURRENT, HISTORY_MONTHS,
+    seasonal_signal, growth_signal, init_ee, evaluate, compute_pixels, _months_ago, ee,
+)
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# Local compute backend: the same analyses as earth_engine.py, evaluated with NumPy over
+# raster chips synced to disk. Each store has a directory of .npy arrays on a lat/lng grid
+# centred on the store, opened memory-mapped so only the pixels touched are paged in.
+#
+#   meta.json                west/north origin, dx/dy (degrees), pixel_m, scenes [{id, date, cloud}]
+#   s2_b4.npy, s2_b8.npy     (scenes, H, W) uint16 Sentinel-2 reflectance
+#   dw_built.npy             (H, W) float32 recent Dynamic World 'built' probability
+#   dw_label_past.npy        (H, W) uint8 Dynamic World label mode, GROWTH_PAST window
+#   dw_label_current.npy     (H, W) uint8 Dynamic World label mode, GROWTH_CURRENT window
+CHIP_DIR = os.environ.get("RASTER_CHIP_DIR", "raster_chips")
+CHIP_PIXEL_METERS = int(os.environ.get("RASTER_CHIP_PIXEL_METERS", "20"))
+MAX_CLOUD_PERCENT = 30
+DW_BUILT_LABEL = 6
+METERS_PER_DEGREE = 111320.0
+# Seasonal analysis reads scenes from this many recent days, so a chip stops being useful as
+# it ages; past CHIP_MAX_AGE_SECONDS it counts as missing (and the caller re-syncs it)
+RECENT_WINDOW_DAYS = 31
+CHIP_MAX_AGE_SECONDS = float(os.environ.get("RASTER_CHIP_MAX_AGE_SECONDS", str(7 * 86400)))
+# Yards around built pixels for the lawn sample: the EE path's focalMax of 10 pixels taken
+# at Sentinel-2's native 10 m, converted to chip pixels in analyze_seasonal_local
+YARD_RADIUS_METERS = 10 * 10
+
+def chip_path(lat: float, lng: float):
+    return os.path.join(CHIP_DIR, f"{lat:.4f}_{lng:.4f}")
+
+def chip_age(lat: float, lng: float):
+    """
+    Seconds since the chip was synced, or None if there is no chip.
+    """
+    meta_path = os.path.join(chip_path(lat, lng), "meta.json")
+    try:
+        with open(meta_path) as f:
+            synced_at = json.load(f).get("synced_at")
+        return time.time() - (synced_at if synced_at is not None else os.path.getmtime(meta_path))
+    except FileNotFoundError:
+        return None
+
+def has_chip(lat: float, lng: float, max_age: float = CHIP_MAX_AGE_SECONDS):
+    """
+    True if the store has a chip synced within max_age seconds.
+    """
+    age = chip_age(lat, lng)
+    return age is not None and age <= max_age
+
+class Chip:
+    def __init__(self, lat: float, lng: float):
+        self.path = chip_path(lat, lng)
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.lat, self.lng = lat, lng
+        self.pixel_m = self.meta["pixel_m"]
+        self.height, self.width = self.meta["height"], self.meta["width"]
+        self.scenes = self.meta.get("scenes", [])
+
+    def band(self, name: str):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def pixel_centers(self):
+        """
+        Latitude/longitude of each row/column centre.
+        """
+        lats = self.meta["north"] - (np.arange(self.height) + 0.5) * self.meta["dy"]
+        lngs = self.meta["west"] + (np.arange(self.width) + 0.5) * self.meta["dx"]
+        return lats, lngs
+
+    def buffer_mask(self, radius_m: float = BUFFER_METERS):
+        lats, lngs = self.pixel_centers()
+        dy_m = (lats - self.lat) * METERS_PER_DEGREE
+        dx_m = (lngs - self.lng) * METERS_PER_DEGREE * math.cos(math.radians(self.lat))
+        return dy_m[:, None] ** 2 + dx_m[None, :] ** 2 <= radius_m ** 2
+
+    def scene_indices(self, start: str, end: str):
+        """
+        Scenes with start <= date < end that pass the cloud filter.
+        """
+        return [i for i, s in enumerate(self.scenes)
+                if start <= s["date"] < end and s.get("cloud", 0) < MAX_CLOUD_PERCENT]
+
+def normalized_difference(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        nd = (a - b) / (a + b)
+    nd[~np.isfinite(nd)] = np.nan
+    return nd
+
+def _median_composite(stack, indices):
+    if not indices:
+        return None
+    data = np.asarray(stack[indices], dtype=np.float32)
+    data[data == 0] = np.nan  # 0 is nodata in the synced reflectance
+    with np.errstate(all="ignore"):
+        return np.nanmedian(data, axis=0)
+
+def focal_max_circle(mask, radius: int):
+    """
+    Binary dilation with a circular kernel of `radius` pixels: every pixel whose centre is
+    within `radius` pixels of a set pixel (dx² + dy² <= radius²), as ee.Kernel.circle builds it.
+    Callers convert meters to chip pixels, since chips aren't at Sentinel-2's native 10 m.
+    The circle is decomposed into one horizontal span per row offset; each span is a
+    sliding-window OR computed from a cumulative sum.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    padded = np.zeros((h + 2 * radius, w + 2 * radius), dtype=np.int32)
+    padded[radius:radius + h, radius:radius + w] = mask
+    csum = np.concatenate([np.zeros((padded.shape[0], 1), dtype=np.int32), np.cumsum(padded, axis=1)], axis=1)
+    out = np.zeros((h, w), dtype=bool)
+    for dy in range(-radius, radius + 1):
+        half = int(math.floor(math.sqrt(radius * radius - dy * dy)))
+        rows = csum[radius + dy:radius + dy + h]
+        left = np.arange(w) + radius - half
+        right = np.arange(w) + radius + half + 1
+        out |= (rows[:, right] - rows[:, left]) > 0
+    return out
+
+def _recent_window():
+    end = datetime.date.today() + datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=RECENT_WINDOW_DAYS)
+    return start.isoformat(), end.isoformat()
+
+def _sample_points(chip: Chip, mask, n: int = 15, seed: int = 0):
+    rows, cols = np.nonzero(mask)
+    if rows.size == 0:
+        return []
+    rng = np.random.default_rng(seed)
+    pick = rng.choice(rows.size, size=min(n, rows.size), replace=False)
+    lats, lngs = chip.pixel_centers()
+    return [{"lat": float(lats[rows[i]]), "lng": float(lngs[cols[i]])} for i in pick]
+
+def analyze_seasonal_local(lat: float, lng: float):
+    chip = Chip(lat, lng)
+    buffer = chip.buffer_mask()
+    start, end = _recent_window()
+    indices = chip.scene_indices(start, end)
+
+    b4 = _median_composite(chip.band("s2_b4"), indices)
+    b8 = _median_composite(chip.band("s2_b8"), indices)
+    if b4 is None:
+        return seasonal_signal(None, None, [])
+    ndvi = normalized_difference(b8, b4)
+
+    values = ndvi[buffer]
+    ndvi_val = float(np.nanmean(values)) if np.isfinite(values).any() else None
+
+    # Built pixels plus surrounding yards
+    radius = max(1, round(YARD_RADIUS_METERS / chip.pixel_m))
+    built_and_yards = focal_max_circle(np.asarray(chip.band("dw_built")) > 0.2, radius)
+    with np.errstate(invalid="ignore"):
+        lawn_mask = (ndvi > 0.3) & built_and_yards & buffer
+    ndvi_points = _sample_points(chip, lawn_mask, seed=hash((round(lat, 4), round(lng, 4))) & 0xFFFFFFFF)
+
+    return seasonal_signal(ndvi_val, None, ndvi_points)
+
+def new_construction_hectares(chip: Chip, buffer=None):
+    buffer = chip.buffer_mask() if buffer is None else buffer
+    built_old = np.asarray(chip.band("dw_label_past")) == DW_BUILT_LABEL
+    built_new = np.asarray(chip.band("dw_label_current")) == DW_BUILT_LABEL
+    new_construction = built_new & ~built_old & buffer
+    return float(np.count_nonzero(new_construction)) * chip.pixel_m ** 2 / 10000
+
+def analyze_growth_local(lat: float, lng: float):
+    chip = Chip(lat, lng)
+    return {**growth_signal(new_construction_hectares(chip), None), "resolution_m": chip.pixel_m, "estimate": "full"}
+
+def analyze_history_local(store_id: str, lat: float, lng: float, months: int = HISTORY_MONTHS):
+    chip = Chip(lat, lng)
+    buffer = chip.buffer_mask()
+    today = datetime.date.today()
+    start = _months_ago(today, months).isoformat()
+    end = (today + datetime.timedelta(days=1)).isoformat()
+
+    b4, b8 = chip.band("s2_b4"), chip.band("s2_b8")
+    history = []
+    for i in chip.scene_indices(start, end):
+        values = normalized_difference(b8[i][buffer], b4[i][buffer])
+        values[(b4[i][buffer] == 0) | (b8[i][buffer] == 0)] = np.nan
+        if np.isfinite(values).any():
+            history.append({"date": chip.scenes[i]["date"], "ndvi": round(float(np.nanmean(values)), 3)})
+    history.sort(key=lambda x: x["date"])
+    return history
+
+def save_chip(lat: float, lng: float, meta: dict, arrays: dict):
+    """
+    Writes a chip atomically enough for readers: arrays first, meta.json last.
+    """
+    path = chip_path(lat, lng)
+    os.makedirs(path, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), arr)
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+def sync_chip(lat: float, lng: float, months: int = HISTORY_MONTHS):
+    """
+    Pulls the rasters a store needs from Earth Engine with computePixels and saves them as a chip.
+    Meant to run as a background job for hot stores.
+    """
+    init_ee()
+
+    half = BUFFER_METERS + 2 * CHIP_PIXEL_METERS
+    dy = CHIP_PIXEL_METERS / METERS_PER_DEGREE
+    dx = CHIP_PIXEL_METERS / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+    size = int(math.ceil(2 * half / CHIP_PIXEL_METERS))
+    west = lng - size / 2 * dx
+    north = lat + size / 2 * dy
+    grid = {
+        "dimensions": {"width": size, "height": size},
+        "affineTransform": {"scaleX": dx, "shearX": 0, "translateX": west,
+                            "shearY": 0, "scaleY": -dy, "translateY": north},
+        "crsCode": "EPSG:4326",
+    }
+
+    def pixels(image, band):
+        arr = compute_pixels({"expression": image, "fileFormat": "NUMPY_NDARRAY", "grid": grid})
+        return np.asarray(arr[band])
+
+    region = ee.Geometry.Point([lng, lat]).buffer(half)
+    today = datetime.date.today()
+    start = _months_ago(today, months).isoformat()
+    end = (today + datetime.timedelta(days=1)).isoformat()
+    s2 = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+          .filterBounds(region)
+          .filterDate(start, end)
+          .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', MAX_CLOUD_PERCENT)))
+    info = evaluate({
+        "ids": s2.aggregate_array('system:index'),
+        "times": s2.aggregate_array('system:time_start'),
+        "clouds": s2.aggregate_array('CLOUDY_PIXEL_PERCENTAGE'),
+    })
+
+    scenes, b4, b8 = [], [], []
+    for scene_id, t, cloud in sorted(zip(info["ids"], info["times"], info["clouds"]), key=lambda x: x[1]):
+        img = s2.filter(ee.Filter.eq('system:index', scene_id)).first().select(['B4', 'B8']).unmask(0).toUint16()
+        arr = compute_pixels({"expression": img, "fileFormat": "NUMPY_NDARRAY", "grid": grid})
+        b4.append(np.asarray(arr["B4"]))
+        b8.append(np.asarray(arr["B8"]))
+        date = datetime.datetime.fromtimestamp(t / 1000, datetime.timezone.utc).date().isoformat()
+        scenes.append({"id": scene_id, "date": date, "cloud": cloud})
+
+    def dw_label(window):
+        return (ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1')
+                .filterBounds(region).filterDate(*window).select('label').mode().unmask(0).toUint8())
+
+    recent_start = (today - datetime.timedelta(days=30)).isoformat()
+    dw_built = (ee.ImageCollection('GOOGLE/DYNAMICWORLD/V1')
+                .filterBounds(region).filterDate(recent_start, end).select('built').median().unmask(0).toFloat())
+
+    empty = np.zeros((0, size, size), dtype=np.uint16)
+    arrays = {
+        "s2_b4": np.stack(b4) if b4 else empty,
+        "s2_b8": np.stack(b8) if b8 else empty,
+        "dw_built": pixels(dw_built, "built").astype(np.float32),
+        "dw_label_past": pixels(dw_label(GROWTH_PAST), "label").astype(np.uint8),
+        "dw_label_current": pixels(dw_label(GROWTH_CURRENT), "label").astype(np.uint8),
+    }
+    meta = {
+        "lat": lat, "lng": lng, "width": size, "height": size,
+        "west": west, "north": north, "dx": dx, "dy": dy,
+        "pixel_m": CHIP_PIXEL_METERS, "scenes": scenes, "synced_at": time.time(),
+    }
+    save_chip(lat, lng, meta, arrays)
+    logger.info(f"Synced raster chip for {lat},{lng}: {len(scenes)} scenes, {size}x{size} px")
+    return {"path": chip_path(lat, lng), "scenes": len(scenes), "size": size}
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .lazy import lazy_import
+
+redis = lazy_import("redis")
+
+logger = logging.getLogger(__name__)
+
+# Second cache tier shared by every worker process, so running several uvicorn workers
+# doesn't multiply upstream fetches. SHARED_CACHE selects the backend:
+#   ""       off (single-process mode, in-memory caches only)
+#   sqlite   a WAL-mode SQLite file at SHARED_CACHE_PATH, for workers on one machine
+#   redis    REDIS_URL, for several instances (needs the optional redis package)
+# Values are stored as JSON.
+#
+# The os.register_at_fork hooks here and in the other services only matter when workers are
+# forked from a process that already imported the app (gunicorn --preload). uvicorn --workers
+# spawns fresh interpreters, which start with clean state anyway.
+SHARED_CACHE = os.environ.get("SHARED_CACHE", "")
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "greengrow-cache.db")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Expired SQLite rows are deleted every this many writes
+PRUNE_EVERY = 1000
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """
+        (value, expires_at) or None.
+        """
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, key: str, value, expires_at: float = None):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), expires_at))
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+class RedisBackend:
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.pttl(key)
+        value, pttl = pipe.execute()
+        if value is None:
+            return None
+        return json.loads(value), (time.time() + pttl / 1000 if pttl and pttl > 0 else None)
+
+    def set(self, key: str, value, expires_at: float = None):
+        px = max(1, int((expires_at - time.time()) * 1000)) if expires_at else None
+        self.client.set(key, json.dumps(value), px=px)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def backend():
+    """
+    The configured shared backend, or None when SHARED_CACHE is off.
+    """
+    global _backend
+    if _backend is None and SHARED_CACHE:
+        with _backend_lock:
+            if _backend is None:
+                if SHARED_CACHE == "sqlite":
+                    _backend = SQLiteBackend(SHARED_CACHE_PATH)
+                elif SHARED_CACHE == "redis":
+                    _backend = RedisBackend(REDIS_URL)
+                else:
+                    raise ValueError(f"Unknown SHARED_CACHE backend: {SHARED_CACHE}")
+                logger.info(f"Shared cache backend: {SHARED_CACHE}")
+    return _backend
+
+def _reset_after_fork():
+    # Connections and sockets opened by the parent must not be reused in a forked worker
+    global _backend, _backend_lock
+    _backend = None
+    _backend_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,90 @@
+import copy
+import functools
+import os
+import threading
+
+from . import deadline, ee_scheduler
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one upstream call.
+    The first caller runs fn; callers arriving while it is in flight wait for its result.
+    Followers wait no longer than their own deadline, and if the leader ran out of its
+    deadline they try again under theirs instead of sharing the leader's DeadlineExceeded.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        op = key[0]
+        first = True
+        while True:
+            with self._lock:
+                stats = self._stats.setdefault(op, {"name": f"singleflight:{op}", "calls": 0, "coalesced": 0})
+                stats["calls"] += first
+                first = False
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    stats["coalesced"] += 1
+
+            if leader:
+                break
+            if not call.done.wait(deadline.remaining()):
+                raise deadline.DeadlineExceeded(f"{op} exceeded its deadline waiting for a coalesced call")
+            if isinstance(call.error, deadline.DeadlineExceeded):
+                continue
+            if call.error is not None:
+                raise call.error
+            # Followers get their own top-level copy so callers can annotate results independently
+            return copy.copy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return [{**s, "in_flight": sum(1 for k in self._calls if k[0] == op)} for op, s in self._stats.items()]
+
+_group = SingleFlight()
+
+def _reset_after_fork():
+    # In-flight calls belong to the parent's threads; the child starts with none
+    global _group
+    _group = SingleFlight()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def coalesce(op: str, key_fn):
+    """
+    Decorator: concurrent calls whose (op, *key_fn(args)) match share one execution.
+    Calls only coalesce within an EE lane, so interactive requests never wait behind batch work.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (op, *key_fn(*args, **kwargs), ee_scheduler.current_lane())
+            return _group.do(key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def stats():
+    return _group.stats()
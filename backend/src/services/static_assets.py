@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from fastapi.responses import Response
+
+from .encoding import qvalues
+
+try:
+    import brotli
+except ImportError:  # optional: `uv pip install brotli` to also serve br variants
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# The built frontend is indexed once at startup and served from memory, with gzip/brotli
+# variants precomputed for text assets. Vite fingerprints everything under assets/
+# (e.g. index-3f2a9c1b.js), so those are cached forever; everything else revalidates.
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+MIN_COMPRESS_BYTES = 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+_HASHED = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+
+class StaticAsset:
+    def __init__(self, rel_path: str, body: bytes):
+        self.rel_path = rel_path
+        self.content_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        immutable = rel_path.startswith("assets/") and _HASHED.search(rel_path)
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        # encoding -> (body, etag); the identity body is always present
+        self.variants = {"identity": (body, self.etag)}
+        if self.content_type.startswith(COMPRESSIBLE) and len(body) >= MIN_COMPRESS_BYTES:
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.variants["gzip"] = (gz, self.etag[:-1] + '-gz"')
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    self.variants["br"] = (br, self.etag[:-1] + '-br"')
+
+def load_static(root: str):
+    """
+    Reads every file under root into memory, keyed by its URL path relative to root.
+    """
+    assets = {}
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            full = os.path.join(dirpath, filename)
+            rel = os.path.relpath(full, root).replace(os.sep, "/")
+            with open(full, "rb") as f:
+                assets[rel] = StaticAsset(rel, f.read())
+            total += len(assets[rel].variants["identity"][0])
+    logger.info(f"Indexed {len(assets)} static files ({total / 1024:.0f} KiB) from {root}")
+    return assets
+
+def _accepted(accept_encoding: str):
+    return {token for token, q in qvalues(accept_encoding).items() if q > 0}
+
+def _etags(if_none_match: str):
+    return {t.strip().removeprefix("W/") for t in if_none_match.split(",") if t.strip()}
+
+def serve(asset: StaticAsset, headers):
+    """
+    Response for an indexed asset honouring Accept-Encoding and If-None-Match.
+    """
+    accepted = _accepted(headers.get("accept-encoding", ""))
+    encoding = next((e for e in ("br", "gzip") if e in accepted and e in asset.variants), "identity")
+    body, etag = asset.variants[encoding]
+    out = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        tags = _etags(if_none_match)
+        if "*" in tags or tags & {tag for _, tag in asset.variants.values()}:
+            return Response(status_code=304, headers=out)
+
+    if encoding != "identity":
+        out["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.content_type, headers=out)
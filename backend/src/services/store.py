@@ -0,0 +1,219 @@
+from sqlmodel import SQLModel, Field, Session, create_engine, select
+from sqlalchemy import event, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Optional
+import json
+import os
+import threading
+import time
+
+# Local SQLite store for analysis results that never change for a given input,
+# plus map tile URLs which expire and are kept in a separate table with a TTL.
+DB_PATH = os.environ.get("GREENGROW_DB_PATH", "greengrow.db")
+TILE_TTL_SECONDS = int(os.environ.get("TILE_TTL_SECONDS", str(2 * 3600)))
+
+engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False, "timeout": 30})
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _):
+    # WAL lets worker processes read while another one writes
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+_READY = False
+_ready_lock = threading.Lock()
+
+def _reset_after_fork():
+    # Pooled connections belong to the parent; the child opens its own
+    global _ready_lock
+    engine.dispose(close=False)
+    _ready_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+class GrowthResult(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    lat: float
+    lng: float
+    buffer_m: int
+    scale: int
+    windows: str
+    hotspot_ha: float
+    created_at: float
+
+class TileLayer(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    url: str
+    expires_at: float
+
+class NdviObservation(SQLModel, table=True):
+    store_key: str = Field(primary_key=True)
+    scene_id: str = Field(primary_key=True)
+    date: str = Field(index=True)
+    ndvi: float
+
+class HistorySync(SQLModel, table=True):
+    # Date range [start_date, end_date) already pulled from EE for a store
+    store_key: str = Field(primary_key=True)
+    start_date: str
+    end_date: str
+    synced_at: float
+
+class Job(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    kind: str
+    payload: str  # JSON
+    status: str = Field(index=True)  # queued | running | done | failed
+    result: Optional[str] = None  # JSON
+    error: Optional[str] = None
+    attempts: int = 0
+    claimed_by: Optional[str] = None  # token of the worker process running it
+    not_before: Optional[float] = None  # a retried job waits until then
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class PortfolioStore(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    name: str
+    address: str = ""
+    lat: float
+    lng: float
+
+class SignalResult(SQLModel, table=True):
+    # Precomputed signal payloads, read by dashboards instead of hitting EE
+    store_id: str = Field(primary_key=True)
+    kind: str = Field(primary_key=True)  # seasonal | growth | history
+    payload: str  # JSON
+    computed_at: float
+
+def _add_new_columns(conn):
+    # create_all leaves existing tables alone; add (nullable) columns introduced since
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if column.name not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}")
+
+def init_store():
+    global _READY
+    if not _READY:
+        with _ready_lock:
+            if not _READY:
+                with engine.connect() as conn:
+                    # Take the write lock first so worker processes starting together
+                    # don't race between the existence check and CREATE TABLE
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                    SQLModel.metadata.create_all(conn)
+                    _add_new_columns(conn)
+                    conn.commit()
+                _READY = True
+
+def _upsert(session, model, rows, set_=None):
+    """
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent writers of the same key don't collide.
+    """
+    if not rows:
+        return
+    stmt = sqlite_insert(model).values(rows)
+    pk = [c.name for c in model.__table__.primary_key]
+    if set_ is None:
+        set_ = {c: stmt.excluded[c] for c in rows[0] if c not in pk}
+    else:
+        set_ = set_(stmt)
+    session.exec(stmt.on_conflict_do_update(index_elements=pk, set_=set_))
+
+def growth_key(lat: float, lng: float, buffer_m: int, scale: int, windows: str):
+    # 4 decimals is ~11 m, well inside a 10 m-scale pixel footprint of a store
+    return f"{round(lat, 4)}:{round(lng, 4)}:{buffer_m}:{scale}:{windows}"
+
+def get_growth_result(key: str):
+    init_store()
+    with Session(engine) as session:
+        row = session.get(GrowthResult, key)
+        return row.hotspot_ha if row else None
+
+def put_growth_result(key: str, lat: float, lng: float, buffer_m: int, scale: int, windows: str, hotspot_ha: float):
+    init_store()
+    with Session(engine) as session:
+        _upsert(session, GrowthResult, [dict(
+            key=key, lat=lat, lng=lng, buffer_m=buffer_m, scale=scale,
+            windows=windows, hotspot_ha=hotspot_ha, created_at=time.time(),
+        )])
+        session.commit()
+
+def get_tile_url(key: str):
+    init_store()
+    with Session(engine) as session:
+        row = session.get(TileLayer, key)
+        if row and row.expires_at > time.time():
+            return row.url
+        return None
+
+def put_tile_url(key: str, url: str, ttl: float = TILE_TTL_SECONDS):
+    init_store()
+    with Session(engine) as session:
+        _upsert(session, TileLayer, [dict(key=key, url=url, expires_at=time.time() + ttl)])
+        session.commit()
+
+def history_key(lat: float, lng: float, buffer_m: int):
+    return f"{round(lat, 4)}:{round(lng, 4)}:{buffer_m}"
+
+def get_history_sync(store_key: str):
+    init_store()
+    with Session(engine) as session:
+        return session.get(HistorySync, store_key)
+
+def put_ndvi_observations(store_key: str, rows, start_date: str, end_date: str):
+    """
+    Upserts (scene_id, date, ndvi) rows and widens the synced range to cover [start_date, end_date).
+    """
+    init_store()
+    with Session(engine) as session:
+        _upsert(session, NdviObservation, [
+            dict(store_key=store_key, scene_id=scene_id, date=date, ndvi=ndvi) for scene_id, date, ndvi in rows
+        ])
+        _upsert(session, HistorySync, [dict(store_key=store_key, start_date=start_date, end_date=end_date, synced_at=time.time())],
+                set_=lambda stmt: {
+                    "start_date": func.min(HistorySync.start_date, stmt.excluded.start_date),
+                    "end_date": func.max(HistorySync.end_date, stmt.excluded.end_date),
+                    "synced_at": stmt.excluded.synced_at,
+                })
+        session.commit()
+
+def query_ndvi(store_key: str, start_date: str, end_date: str = None):
+    init_store()
+    with Session(engine) as session:
+        stmt = select(NdviObservation).where(
+            NdviObservation.store_key == store_key,
+            NdviObservation.date >= start_date,
+        )
+        if end_date:
+            stmt = stmt.where(NdviObservation.date < end_date)
+        rows = session.exec(stmt.order_by(NdviObservation.date)).all()
+        return [{"date": r.date, "ndvi": r.ndvi} for r in rows]
+
+def put_portfolio(stores):
+    init_store()
+    with Session(engine) as session:
+        _upsert(session, PortfolioStore, [PortfolioStore(**st).model_dump() for st in stores])
+        session.commit()
+
+def get_portfolio():
+    init_store()
+    with Session(engine) as session:
+        return [s.model_dump() for s in session.exec(select(PortfolioStore)).all()]
+
+def put_signal_result(store_id: str, kind: str, payload):
+    init_store()
+    with Session(engine) as session:
+        _upsert(session, SignalResult, [dict(store_id=store_id, kind=kind, payload=json.dumps(payload), computed_at=time.time())])
+        session.commit()
+
+def get_signal_results(store_id: str):
+    init_store()
+    with Session(engine) as session:
+        rows = session.exec(select(SignalResult).where(SignalResult.store_id == store_id)).all()
+        return {r.kind: {"computed_at": r.computed_at, "data": json.loads(r.payload)} for r in rows}
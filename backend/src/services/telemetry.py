@@ -0,0 +1,119 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histograms and error counters per upstream stage, exported in Prometheus text
+# format. Spans recorded while handling a request are also collected per request so the
+# API can echo them in a Server-Timing header.
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+_lock = threading.Lock()
+_histograms = {}
+_errors = {}
+
+def _reset_after_fork():
+    # Each worker reports its own metrics
+    global _lock
+    _lock = threading.Lock()
+    _histograms.clear()
+    _errors.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+def observe(metric: str, labels: tuple, seconds: float):
+    with _lock:
+        hist = _histograms.get((metric, labels))
+        if hist is None:
+            hist = _histograms[(metric, labels)] = Histogram()
+        hist.observe(seconds)
+
+def count_error(stage: str):
+    with _lock:
+        _errors[stage] = _errors.get(stage, 0) + 1
+
+@contextmanager
+def span(stage: str):
+    """
+    Times an upstream stage (e.g. ee_getinfo, dc_resolve, open_meteo, gemini).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        count_error(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("upstream", (("stage", stage),), elapsed)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+def start_request():
+    """
+    Starts collecting spans for the current request; returns the list they are appended to.
+    """
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+def server_timing(spans, total: float = None):
+    # One entry per stage: summed duration in ms, with the call count as description
+    agg = {}
+    for stage, seconds in spans:
+        dur, n = agg.get(stage, (0.0, 0))
+        agg[stage] = (dur + seconds, n + 1)
+    parts = [f'{stage};dur={dur * 1000:.1f};desc="{n}x"' for stage, (dur, n) in agg.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+def _fmt_labels(labels, extra: str = None):
+    items = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+def render_prometheus(extra_gauges=None):
+    """
+    Prometheus text exposition of all histograms and error counters.
+    extra_gauges is an optional list of (name, labels tuple, value).
+    """
+    lines = []
+    with _lock:
+        metrics = sorted({m for m, _ in _histograms})
+        for metric in metrics:
+            name = f"greengrow_{metric}_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for (m, labels), hist in sorted(_histograms.items()):
+                if m != metric:
+                    continue
+                for bound, count in zip(BUCKETS, hist.counts):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_fmt_labels(labels, le)} {hist.total}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {hist.total}")
+        lines.append("# TYPE greengrow_upstream_errors_total counter")
+        for stage, n in sorted(_errors.items()):
+            lines.append(f'greengrow_upstream_errors_total{{stage="{stage}"}} {n}')
+    for name, labels, value in extra_gauges or []:
+        lines.append(f"greengrow_{name}{_fmt_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
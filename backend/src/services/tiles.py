@@ -0,0 +1,246 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; there only one process uses the cache
+    fcntl = None
+
+from .earth_engine import BUFFER_METERS, layer_url_format, parse_layer_id
+from .singleflight import coalesce
+from .telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Tiles fetched from EE are kept in a size-bounded on-disk LRU so repeat map views across
+# users are served locally. Seasonal NDVI follows a rolling 30-day window, so its tiles
+# go stale after a day; growth compares fixed windows and its tiles never change.
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR", "tile_cache")
+TILE_CACHE_MAX_BYTES = int(os.environ.get("TILE_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Worker processes share the directory but each keeps its own index. After writing this
+# fraction of the cap, a worker rescans the directory under a file lock and evicts across
+# all workers' tiles, so the cap holds for the directory (overshoot <= workers x fraction).
+TILE_CACHE_RESCAN_FRACTION = 1 / 16
+TILE_MAX_AGE = {"seasonal": 24 * 3600, "growth": None}
+# Precompute jobs render zooms PRERENDER_MIN_ZOOM..TILE_PRERENDER_MAX_ZOOM around hot stores (0 disables)
+PRERENDER_MIN_ZOOM = 10
+TILE_PRERENDER_MAX_ZOOM = int(os.environ.get("TILE_PRERENDER_MAX_ZOOM", "0"))
+# Status codes EE returns for a map ID it no longer knows
+_EXPIRED = (400, 403, 404, 410)
+
+def _new_session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=1))
+    return session
+
+_session = _new_session()
+
+class DiskLRU:
+    """
+    Files under root keyed by "layer/z/x/y", evicted least-recently-used beyond max_bytes.
+    A file's mtime is its write time and its atime its last use, so the index can be
+    rebuilt from disk in LRU order, including tiles written or read by other processes.
+    """
+    def __init__(self, name: str, root: str, max_bytes: int):
+        self.name = name
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index = None  # key -> (size, written_at), least recently used first
+        self._bytes = 0
+        self._written = 0  # bytes written since the last rescan
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str):
+        return os.path.join(self.root, *key.split("/")) + ".png"
+
+    def _load(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".png"):
+                    continue
+                full = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue  # evicted by another process mid-scan
+                key = os.path.relpath(full, self.root)[:-4].replace(os.sep, "/")
+                entries.append((st.st_atime, key, st.st_size, st.st_mtime))
+        self._index = OrderedDict((key, (size, mtime)) for _, key, size, mtime in sorted(entries))
+        self._bytes = sum(size for size, _ in self._index.values())
+        self._written = 0
+
+    def get(self, key: str, max_age: float = None):
+        with self._lock:
+            if self._index is None:
+                self._load()
+            entry = self._index.get(key)
+            if entry is None:
+                entry = self._adopt(key)
+            if entry is None or (max_age is not None and time.time() - entry[1] > max_age):
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, (time.time(), entry[1]))  # record the use for other processes' rescans
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self._discard(key)
+            return None
+
+    def _adopt(self, key: str):
+        # A tile another worker wrote since our last scan
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        self._index[key] = (st.st_size, st.st_mtime)
+        self._bytes += st.st_size
+        return self._index[key]
+
+    def set(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._index is None:
+                self._load()
+            self._discard(key)
+            self._index[key] = (len(data), time.time())
+            self._bytes += len(data)
+            self._written += len(data)
+            if self._bytes > self.max_bytes or self._written >= self.max_bytes * TILE_CACHE_RESCAN_FRACTION:
+                self._evict_shared()
+
+    def _evict_shared(self):
+        # Rescan under an exclusive lock so the cap covers every process's tiles
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._load()
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                old_key, _ = next(iter(self._index.items()))
+                self._discard(old_key, remove=True)
+                self.evictions += 1
+
+    def _discard(self, key: str, remove: bool = False):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[0]
+        if remove:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._index or {}),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+_tile_cache = DiskLRU("ee_tiles", TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES)
+
+def _reset_after_fork():
+    global _session
+    _session = _new_session()
+    _tile_cache._lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def cache_stats():
+    return [_tile_cache.stats()]
+
+@coalesce("map_id", lambda kind, lat, lng, refresh=False: (kind, lat, lng, refresh))
+def _url_format(kind: str, lat: float, lng: float, refresh: bool = False):
+    # All tiles of a newly viewed layer arrive at once; they share one getMapId
+    return layer_url_format(kind, lat, lng, refresh=refresh)
+
+def _fetch(url_format: str, z: int, x: int, y: int):
+    with span("ee_tile"):
+        return _session.get(url_format.format(z=z, x=x, y=y), timeout=30)
+
+@coalesce("tile", lambda layer, z, x, y: (layer, z, x, y))
+def get_tile(layer: str, z: int, x: int, y: int):
+    """
+    PNG bytes for one tile of a layer, from the disk cache or EE.
+    Raises ValueError for an unknown layer id.
+    """
+    kind, lat, lng = parse_layer_id(layer)
+    key = f"{layer}/{z}/{x}/{y}"
+    data = _tile_cache.get(key, TILE_MAX_AGE[kind])
+    if data is not None:
+        return data
+
+    resp = _fetch(_url_format(kind, lat, lng), z, x, y)
+    if resp.status_code in _EXPIRED:
+        # The stored map ID expired upstream before its TTL did; mint a new one and retry once
+        logger.info(f"Refreshing map ID for {layer} after HTTP {resp.status_code}")
+        resp = _fetch(_url_format(kind, lat, lng, refresh=True), z, x, y)
+    resp.raise_for_status()
+    _tile_cache.set(key, resp.content)
+    return resp.content
+
+def max_age(layer: str):
+    """
+    Browser cache lifetime in seconds for tiles of a layer.
+    """
+    return TILE_MAX_AGE[parse_layer_id(layer)[0]] or 30 * 24 * 3600
+
+def _tile_range(lat: float, lng: float, z: int):
+    # Web Mercator tiles covering the analysis buffer around a store
+    d_lat = BUFFER_METERS / 111320
+    d_lng = d_lat / max(math.cos(math.radians(lat)), 0.01)
+    n = 2 ** z
+
+    def tile_xy(la, ln):
+        x = int((ln + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(la))) / math.pi) / 2 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    x0, y0 = tile_xy(lat + d_lat, lng - d_lng)
+    x1, y1 = tile_xy(lat - d_lat, lng + d_lng)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+def prerender(layer: str, max_zoom: int = None):
+    """
+    Warms the tile cache for a layer at low zoom levels; returns the number of tiles rendered.
+    """
+    max_zoom = TILE_PRERENDER_MAX_ZOOM if max_zoom is None else max_zoom
+    _, lat, lng = parse_layer_id(layer)
+    rendered = 0
+    for z in range(PRERENDER_MIN_ZOOM, max_zoom + 1):
+        for x, y in _tile_range(lat, lng, z):
+            try:
+                get_tile(layer, z, x, y)
+                rendered += 1
+            except Exception as e:
+                logger.error(f"Prerender of {layer}/{z}/{x}/{y} failed: {e}")
+    return rendered
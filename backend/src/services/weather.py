@@ -1,19 +1,70 @@
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+import os
+import time
+
+from . import deadline
+from .cache import TTLCache, snap
+from .singleflight import coalesce
+from .telemetry import span
 
 logger = logging.getLogger(__name__)
 
+# Forecast models behind Open-Meteo are ~0.1 degree grids, so stores within the same
+# cell get an identical forecast. Snap to that grid and share one cached response.
+GRID_PRECISION = 1
+# Open-Meteo refreshes its model output hourly; cached entries expire at the next refresh.
+MODEL_REFRESH_SECONDS = 3600
+
+_forecast_cache = TTLCache("weather_forecast", maxsize=5000, ttl=MODEL_REFRESH_SECONDS)
+
+def _new_session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=1))
+    return session
+
+_session = _new_session()
+
+def _reset_after_fork():
+    # Pooled sockets inherited from the parent would be shared by two processes
+    global _session
+    _session = _new_session()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def warm_pool():
+    """
+    Opens a pooled TLS connection to Open-Meteo ahead of the first forecast request.
+    """
+    _session.head("https://api.open-meteo.com/v1/forecast", timeout=5)
+
+def cache_stats():
+    return [_forecast_cache.stats()]
+
+def _seconds_until_refresh(now: float = None):
+    now = time.time() if now is None else now
+    return MODEL_REFRESH_SECONDS - (now % MODEL_REFRESH_SECONDS)
+
+@coalesce("weather", lambda lat, lng: (snap(lat, GRID_PRECISION), snap(lng, GRID_PRECISION)))
 def get_weather_forecast(lat: float, lng: float):
     """
     Fetches the current weather and a brief 7-day forecast from Open-Meteo API.
-    Does not require an API key.
+    Does not require an API key. Results are cached per grid cell until the next model refresh.
     """
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lng}&current=temperature_2m,relative_humidity_2m,weather_code&daily=weather_code,temperature_2m_max,temperature_2m_min,precipitation_probability_max&temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch&timezone=auto"
+    cell = (snap(lat, GRID_PRECISION), snap(lng, GRID_PRECISION))
+    cached = _forecast_cache.get(cell)
+    if cached is not None:
+        return dict(cached)
+
+    url = f"https://api.open-meteo.com/v1/forecast?latitude={cell[0]}&longitude={cell[1]}&current=temperature_2m,relative_humidity_2m,weather_code&daily=weather_code,temperature_2m_max,temperature_2m_min,precipitation_probability_max&temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch&timezone=auto"
     
+    deadline.check("open_meteo")
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        with span("open_meteo"):
+            response = _session.get(url, timeout=deadline.timeout(5))
+            response.raise_for_status()
+            data = response.json()
         
         current = data.get("current", {})
         daily = data.get("daily", {})
@@ -37,12 +88,17 @@ def get_weather_forecast(lat: float, lng: float):
              max_precip = daily["precipitation_probability_max"][:3]
              forecast_str = f"Next 3 days Highs: ~{sum(max_temps)/len(max_temps):.0f}°F, Max Precip Prob: {max(max_precip)}%"
         
-        return {
+        result = {
             "current_temperature": f"{current_temp}°F",
             "current_condition": condition,
             "forecast_summary": forecast_str
         }
+        _forecast_cache.set(cell, result, ttl=_seconds_until_refresh())
+        return dict(result)
 
     except Exception as e:
+        if deadline.remaining() == 0.0:
+            # Timed out because the request budget ran out; let the caller report weather as missing
+            raise deadline.DeadlineExceeded(f"open_meteo exceeded its deadline: {e}") from e
         logger.error(f"Weather Fetch Error: {e}")
         return {}
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from src.services import deadline, ee_scheduler
+from src.services.ee_scheduler import EEQuotaExceeded, Scheduler
+
+def start_call(scheduler, lane, release, order=None, tag=None):
+    """
+    Runs a call in `lane` on its own thread that holds its slot until `release` is set.
+    """
+    def call():
+        if order is not None:
+            order.append(tag)
+        release.wait(5)
+
+    def run():
+        with ee_scheduler.lane(lane):
+            scheduler.run(call)
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
+
+def wait_for(predicate, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.005)
+
+def lane_stat(scheduler, lane, field):
+    return scheduler.stats()["lanes"][lane][field]
+
+def test_batch_leaves_interactive_reserve_free():
+    scheduler = Scheduler(4, 1)
+    release = threading.Event()
+    threads = [start_call(scheduler, "batch", release) for _ in range(3)]
+    wait_for(lambda: lane_stat(scheduler, "batch", "active") == 3)
+
+    # A fourth batch call would eat into the reserve, so it queues
+    with ee_scheduler.lane("batch"), deadline.within(0.05):
+        with pytest.raises(deadline.DeadlineExceeded):
+            scheduler.run(lambda: None)
+    # while an interactive call takes the reserved slot at once
+    with deadline.within(0.05):
+        assert scheduler.run(lambda: "ok") == "ok"
+
+    release.set()
+    for t in threads:
+        t.join()
+
+def test_interactive_waiter_goes_before_earlier_batch_waiter():
+    scheduler = Scheduler(1, 0)
+    hold, release = threading.Event(), threading.Event()
+    order = []
+    holder = start_call(scheduler, "interactive", hold)
+    wait_for(lambda: lane_stat(scheduler, "interactive", "active") == 1)
+
+    batch = start_call(scheduler, "batch", release, order, "batch")
+    wait_for(lambda: lane_stat(scheduler, "batch", "queued") == 1)
+    interactive = start_call(scheduler, "interactive", release, order, "interactive")
+    wait_for(lambda: lane_stat(scheduler, "interactive", "queued") == 1)
+
+    hold.set()
+    holder.join()
+    wait_for(lambda: order)
+    assert order == ["interactive"]
+    release.set()
+    for t in (batch, interactive):
+        t.join()
+    assert order == ["interactive", "batch"]
+
+def test_quota_errors_retry_then_raise(monkeypatch):
+    monkeypatch.setattr(ee_scheduler, "EE_BACKOFF_BASE", 0.001)
+    scheduler = Scheduler(2, 0)
+    calls = []
+
+    def rejected():
+        calls.append(1)
+        raise RuntimeError("429 Too Many Requests")
+
+    with pytest.raises(EEQuotaExceeded):
+        scheduler.run(rejected)
+    lanes = scheduler.stats()["lanes"]["interactive"]
+    assert len(calls) == ee_scheduler.EE_MAX_RETRIES["interactive"] + 1
+    assert lanes["calls"] == 1
+    assert lanes["attempts"] == len(calls)
+    assert lanes["active"] == 0
+
+def test_lane_pools_match_slots():
+    scheduler = Scheduler(6, 2)
+    assert scheduler.executor("interactive")._max_workers == 6
+    assert scheduler.executor("batch")._max_workers == scheduler.batch_limit == 4
@@ -0,0 +1,148 @@
+import datetime
+import math
+import time
+
+import numpy as np
+import pytest
+
+from src.services import raster_local
+from src.services.earth_engine import BUFFER_METERS, growth_signal, seasonal_signal
+from src.services.raster_local import (
+    Chip, METERS_PER_DEGREE, focal_max_circle, new_construction_hectares, save_chip,
+)
+
+LAT, LNG = 40.1, -75.2
+
+def naive_dilation(mask, radius):
+    h, w = mask.shape
+    out = np.zeros_like(mask)
+    for y, x in zip(*np.nonzero(mask)):
+        for dy in range(-radius, radius + 1):
+            for dx in range(-radius, radius + 1):
+                if dx * dx + dy * dy <= radius * radius and 0 <= y + dy < h and 0 <= x + dx < w:
+                    out[y + dy, x + dx] = True
+    return out
+
+def chip_size(pixel_m=100):
+    return int(math.ceil(2 * (BUFFER_METERS + 2 * pixel_m) / pixel_m))
+
+def make_chip(tmp_path, monkeypatch, pixel_m=100, scenes=(), b4=None, b8=None, built=None, past=None, current=None,
+              synced_at=None):
+    """
+    A synthetic chip just covering the 5-mile buffer; unspecified bands are empty.
+    """
+    monkeypatch.setattr(raster_local, "CHIP_DIR", str(tmp_path))
+    size = chip_size(pixel_m)
+    dy = pixel_m / METERS_PER_DEGREE
+    dx = pixel_m / (METERS_PER_DEGREE * math.cos(math.radians(LAT)))
+    meta = {"west": LNG - size / 2 * dx, "north": LAT + size / 2 * dy, "dx": dx, "dy": dy,
+            "pixel_m": pixel_m, "height": size, "width": size, "scenes": list(scenes),
+            "synced_at": time.time() if synced_at is None else synced_at}
+    n = len(scenes)
+    save_chip(LAT, LNG, meta, {
+        "s2_b4": np.zeros((n, size, size), dtype=np.uint16) if b4 is None else b4,
+        "s2_b8": np.zeros((n, size, size), dtype=np.uint16) if b8 is None else b8,
+        "dw_built": np.zeros((size, size), dtype=np.float32) if built is None else built,
+        "dw_label_past": np.zeros((size, size), dtype=np.uint8) if past is None else past,
+        "dw_label_current": np.zeros((size, size), dtype=np.uint8) if current is None else current,
+    })
+    return Chip(LAT, LNG)
+
+def days_ago(n):
+    return (datetime.date.today() - datetime.timedelta(days=n)).isoformat()
+
+@pytest.mark.parametrize("radius", [1, 2, 3, 5])
+def test_focal_max_circle_matches_naive_dilation(radius):
+    rng = np.random.default_rng(radius)
+    mask = rng.random((40, 37)) > 0.97
+    # Set pixels on the border exercise the padding
+    mask[0, 0] = mask[-1, 5] = mask[12, -1] = True
+    assert np.array_equal(focal_max_circle(mask, radius), naive_dilation(mask, radius))
+
+def test_focal_max_circle_kernel_shape():
+    mask = np.zeros((7, 7), dtype=bool)
+    mask[3, 3] = True
+    kernel = focal_max_circle(mask, 1)
+    assert kernel.sum() == 5  # centre plus the 4 neighbours; diagonals are sqrt(2) away
+    assert kernel[2, 3] and kernel[3, 2] and not kernel[2, 2]
+
+def test_buffer_mask_area_matches_disc(tmp_path, monkeypatch):
+    chip = make_chip(tmp_path, monkeypatch, pixel_m=20)
+    area = chip.buffer_mask().sum() * chip.pixel_m ** 2
+    assert area == pytest.approx(math.pi * BUFFER_METERS ** 2, rel=0.01)
+
+def test_new_construction_hectares_counts_only_new_built_pixels_in_buffer(tmp_path, monkeypatch):
+    size = chip_size()
+    past = np.zeros((size, size), dtype=np.uint8)
+    current = np.zeros((size, size), dtype=np.uint8)
+    c = size // 2
+    current[c - 5:c + 5, c - 5:c + 5] = 6          # 100 new built pixels at the centre
+    past[c - 5:c, c - 5:c + 5] = 6                 # 50 of them were already built
+    current[0:3, 0:3] = 6                          # corner, outside the buffer
+    chip = make_chip(tmp_path, monkeypatch, past=past, current=current)
+    assert new_construction_hectares(chip) == pytest.approx(50 * 100 ** 2 / 10000)
+
+def test_growth_local_matches_ee_response_shape(tmp_path, monkeypatch):
+    make_chip(tmp_path, monkeypatch)
+    result = raster_local.analyze_growth_local(LAT, LNG)
+    assert set(result) == set(growth_signal(0.0, None)) | {"resolution_m", "estimate"}
+    assert result["intensity"] == "Low"
+    assert result["resolution_m"] == 100
+
+def test_seasonal_local_known_ndvi(tmp_path, monkeypatch):
+    size = chip_size()
+    scenes = [{"id": "a", "date": days_ago(3), "cloud": 5}, {"id": "b", "date": days_ago(10), "cloud": 5}]
+    # NDVI = (3000 - 1000) / (3000 + 1000) = 0.5 everywhere
+    b4 = np.full((2, size, size), 1000, dtype=np.uint16)
+    b8 = np.full((2, size, size), 3000, dtype=np.uint16)
+    built = np.zeros((size, size), dtype=np.float32)
+    built[size // 2, size // 2] = 0.9
+    make_chip(tmp_path, monkeypatch, scenes=scenes, b4=b4, b8=b8, built=built)
+
+    result = raster_local.analyze_seasonal_local(LAT, LNG)
+    expected = seasonal_signal(0.5, None, [])
+    assert result["metric"] == expected["metric"]
+    assert result["intensity"] == "High"
+    # Lawn points come from the built pixel and its yard radius only
+    assert 0 < len(result["geo_points"]) <= 15
+    for p in result["geo_points"]:
+        assert abs(p["lat"] - LAT) * METERS_PER_DEGREE < 2 * raster_local.YARD_RADIUS_METERS
+
+def test_history_local_skips_cloudy_scenes_and_sorts(tmp_path, monkeypatch):
+    size = chip_size()
+    scenes = [
+        {"id": "new", "date": days_ago(5), "cloud": 10},
+        {"id": "old", "date": days_ago(40), "cloud": 10},
+        {"id": "cloudy", "date": days_ago(20), "cloud": 80},
+    ]
+    b4 = np.full((3, size, size), 1000, dtype=np.uint16)
+    b8 = np.stack([np.full((size, size), v, dtype=np.uint16) for v in (3000, 1000, 2000)])
+    make_chip(tmp_path, monkeypatch, scenes=scenes, b4=b4, b8=b8)
+
+    history = raster_local.analyze_history_local("s1", LAT, LNG, months=6)
+    assert history == [{"date": days_ago(40), "ndvi": 0.0}, {"date": days_ago(5), "ndvi": 0.5}]
+
+def test_stale_chip_counts_as_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(raster_local, "CHIP_DIR", str(tmp_path))
+    assert not raster_local.has_chip(LAT, LNG)
+    make_chip(tmp_path, monkeypatch)
+    assert raster_local.has_chip(LAT, LNG)
+    make_chip(tmp_path, monkeypatch, synced_at=time.time() - (raster_local.RECENT_WINDOW_DAYS + 1) * 86400)
+    assert not raster_local.has_chip(LAT, LNG)
+
+def test_auto_backend_falls_back_to_ee_and_resyncs_stale_chip(tmp_path, monkeypatch):
+    from src.services import intelligence
+
+    make_chip(tmp_path, monkeypatch, synced_at=time.time() - 40 * 86400)
+    submitted = []
+    monkeypatch.setattr(intelligence, "COMPUTE_BACKEND", "auto")
+    monkeypatch.setattr(intelligence.jobs, "has_pending", lambda kind, key, value: bool(submitted))
+    monkeypatch.setattr(intelligence.jobs, "submit", lambda kind, payload: submitted.append((kind, payload)))
+
+    assert not intelligence._use_local(LAT, LNG)
+    assert not intelligence._use_local(LAT, LNG)
+    assert [kind for kind, _ in submitted] == ["sync_chip"]
+    assert submitted[0][1]["lat"] == LAT
+
+    make_chip(tmp_path, monkeypatch)
+    assert intelligence._use_local(LAT, LNG)
@@ -110,7 +110,7 @@ function App() {
     const rows = data.signals.map((signal: Signal) => {
       // Escape commas in strings by wrapping them in quotes
       const safeStoreName = `"${selectedStore?.name || ''}"`;
-      const safeMarketSignal = `"${signal.market_signal.replace(/"/g, '""')}"`;
+      const safeMarketSignal = `"${(signal.market_signal ?? '').replace(/"/g, '""')}"`;
       const safeStockingAction = signal.stocking_action ? `"${signal.stocking_action.replace(/"/g, '""')}"` : '""';
 
 
@@ -118,10 +118,10 @@ function App() {
         safeStoreName,
         selectedStore?.id || '',
         signal.type,
-        `"${signal.metric}"`,
+        `"${signal.metric ?? ''}"`,
         safeMarketSignal,
         safeStockingAction,
-        signal.intensity
+        signal.intensity ?? ''
       ].join(',');
     });
 
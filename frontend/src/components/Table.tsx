@@ -26,7 +26,8 @@ export const TableView: React.FC<TableViewProps> = ({ store, data, locationConte
 
   const handleGenerateAction = async (signal: any, idx: number) => {
 
-    if (!store) return;
+    // A pending signal has no classification to base a recommendation on yet
+    if (!store || signal.metric == null || signal.market_signal == null) return;
     const key = `${signal.type}-${idx}`;
     setLoadingAction(prev => ({ ...prev, [key]: true }));
 
@@ -70,7 +71,7 @@ export const TableView: React.FC<TableViewProps> = ({ store, data, locationConte
     }
   };
 
-  const getIntensityColor = (intensity: string) => {
+  const getIntensityColor = (intensity: string | null) => {
     switch (intensity) {
       case 'Extreme':
         return 'bg-red-500/20 text-red-400 border-red-500/50';
@@ -252,22 +253,24 @@ export const TableView: React.FC<TableViewProps> = ({ store, data, locationConte
                     </div>
                     <div>
                       <h4 className="font-semibold text-google-gray-900">{signal.type}</h4>
-                      <div className="text-xs text-google-gray-800 uppercase tracking-wider">{signal.metric}</div>
+                      <div className="text-xs text-google-gray-800 uppercase tracking-wider">{signal.metric ?? 'Still computing'}</div>
                     </div>
                   </div>
                   <span className={`px-2.5 py-1 text-xs font-bold rounded-full border ${getIntensityColor(signal.intensity)}`}>
-                    {signal.intensity.toUpperCase()}
+                    {signal.intensity ? signal.intensity.toUpperCase() : 'PENDING'}
                   </span>
                 </div>
 
                 <div className="grid grid-cols-2 gap-4 mt-4 pt-4 border-t border-google-gray-200">
                   <div>
                     <div className="text-xs text-google-gray-800 mb-1">MARKET SIGNAL</div>
-                    <div className="text-sm text-google-gray-900">{signal.market_signal}</div>
+                    <div className="text-sm text-google-gray-900">{signal.market_signal ?? 'Satellite analysis is running in the background; check back shortly.'}</div>
                   </div>
                   <div>
                     <div className="text-xs text-google-gray-800 mb-1 font-semibold text-google-green">STOCKING ACTION</div>
-                    {signal.stocking_action || generatedActions[`${signal.type}-${idx}`] ? (
+                    {signal.metric == null ? (
+                      <div className="text-sm text-google-gray-800">Available once the signal is ready</div>
+                    ) : signal.stocking_action || generatedActions[`${signal.type}-${idx}`] ? (
                       <div className="text-sm font-medium text-google-gray-900 bg-google-green/5 p-2 rounded-lg border border-google-green/20">{signal.stocking_action || generatedActions[`${signal.type}-${idx}`]}</div>
                     ) : (
                       <button
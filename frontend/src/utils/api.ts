@@ -8,16 +8,30 @@ export interface Store {
   lng: number;
 }
 
+// metric, market_signal and intensity are null when the signal itself missed the request
+// budget (partial, with 'gee' in missing); it is computed in the background for next time
 export interface Signal {
   type: string;
-  metric: string;
-  market_signal: string;
+  metric: string | null;
+  market_signal: string | null;
   stocking_action: string | null;
-  intensity: 'High' | 'Medium' | 'Extreme';
+  intensity: 'High' | 'Medium' | 'Low' | 'Extreme' | null;
 
   tile_url?: string;
   geo_points?: { lat: number; lng: number }[];
   location_context?: Record<string, any>;
+
+  // Growth only: pixel size the built-up mask was read at, and whether the hectares come
+  // from a random sample of it (adaptive mode) or the full reduction
+  resolution_m?: number;
+  estimate?: 'sampled' | 'full';
+
+  // Deadline markers: partial = some upstreams missed the budget (listed in missing),
+  // stale = last good result served while a background refresh runs
+  partial?: boolean;
+  stale?: boolean;
+  missing?: string[];
+  age_seconds?: number;
 }
 
 export interface HistoryData {
@@ -78,6 +92,38 @@ export const analyzeHistory = async (store: Store): Promise<HistoryData[] | null
   }
 };
 
+export interface TradeAreaRing {
+  radius_m: number;
+  radius_miles: number;
+  ndvi: number | null;  // within the radius
+  ring_ndvi: number | null;  // between the previous radius and this one
+  hotspot_ha: number;
+  ring_hotspot_ha: number;
+  built_up_change_pct: number;
+  seasonal: Signal;
+  history: HistoryData[];
+}
+
+export interface RingsResponse {
+  rings: TradeAreaRing[];
+  resolution_m: number;
+}
+
+export const analyzeRings = async (store: Store, radiiMiles: number[] = [1, 3, 5]): Promise<RingsResponse | null> => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/analyze/rings?radii=${radiiMiles.join(',')}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(store)
+    });
+    if (!response.ok) throw new Error("Ring analysis failed");
+    return await response.json();
+  } catch (error) {
+    console.error('Error analyzing rings:', error);
+    return null;
+  }
+};
+
 export interface StockingRequest {
   store_name: string;
   signal_type: string;
@@ -126,3 +172,45 @@ export const fetchLocationContext = async (store: Store): Promise<LocationContex
   }
 };
 
+
+export type StoreAnalysisEvent =
+  | { event: 'weather' | 'demographics'; data: LocationContext }
+  | { event: 'ndvi' | 'seasonal' | 'growth'; data: Signal }
+  | { event: 'history'; data: HistoryData[] }
+  | { event: 'stocking_action'; data: { signal_type: string; stocking_action: string } }
+  | { event: 'error'; data: { part: string; detail: string } }
+  | { event: 'done'; data: { store_id: string } };
+
+// Single streaming request for a whole store analysis; onEvent fires as each part is ready.
+export const streamStoreAnalysis = async (
+  store: Store,
+  onEvent: (event: StoreAnalysisEvent) => void
+): Promise<boolean> => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(store)
+    });
+    if (!response.ok || !response.body) throw new Error("Streaming analysis failed");
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      for (const line of lines) {
+        if (line.trim()) onEvent(JSON.parse(line) as StoreAnalysisEvent);
+      }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer) as StoreAnalysisEvent);
+    return true;
+  } catch (error) {
+    console.error('Error streaming store analysis:', error);
+    return false;
+  }
+};